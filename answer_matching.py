@@ -0,0 +1,241 @@
+"""
+Matching free-text answers against a short_text question's acceptable answers.
+
+`correct_answer_text` lists the acceptable answers separated by "|". Text without a "|" is
+split on commas instead, which is how it was read before the pipe separator existed, so
+existing questions keep grading the same way (use "|" to keep a comma inside an answer).
+Each alternative is one of:
+
+    Paris               text, compared case-insensitively; wrapping quotes, trailing sentence
+                        punctuation and hyphens between words are ignored, but symbols are
+                        not ("C#" doesn't accept "C++" or "C"; "==" is a valid answer)
+    ~photosynthesis     text that also accepts small typos (bounded edit distance)
+    3.14 ± 0.01         a number, optionally with an absolute or percent tolerance
+                        ("±" or "+-"; "100 +- 5%"); "0.50" and ".5" match "0.5"
+    re:colou?r          a regular expression that must match the whole (case-folded) answer
+
+Everything is compiled once per distinct answer text (see compile_matcher), so grading an
+answer is a set lookup, one bisect, one combined regex match and a handful of deletion-index
+lookups, however many alternatives the question lists.
+"""
+
+import bisect
+import math
+import re
+import unicodedata
+from functools import lru_cache
+
+SEPARATOR = '|'
+LEGACY_SEPARATOR = ','
+REGEX_PREFIX = 're:'
+FUZZY_PREFIX = '~'
+MAX_FUZZY_EDITS = 2
+
+_EDGES = re.compile(r'^["\'(\[{«“‘]+|["\'.,!?;:)\]}»”’]+$')
+_WORD_JOINERS = re.compile(r'(?<=\w)[-_‐–](?=\w)')
+_SEPARATING_PUNCTUATION = re.compile(r'[,;:](?=\s)')
+_WHITESPACE = re.compile(r'\s+')
+_NUMBER = r'[-+]?(?:\d+(?:\.\d*)?|\.\d+)(?:e[-+]?\d+)?'
+_NUMERIC_SPEC = re.compile(rf'^({_NUMBER})\s*(?:(?:±|\+-|\+/-)\s*({_NUMBER})\s*(%)?)?$', re.IGNORECASE)
+_NUMERIC_ANSWER = re.compile(rf'^{_NUMBER}$', re.IGNORECASE)
+_THOUSANDS = re.compile(r'^[-+]?\d{1,3}(?:,\d{3})+(?:\.\d*)?$')
+_RELATIVE_EPSILON = 1e-9
+
+
+def fold(text):
+    """NFKC, accents stripped, case-folded and with runs of whitespace collapsed."""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return _WHITESPACE.sub(' ', unicodedata.normalize('NFKC', stripped).casefold()).strip()
+
+
+def normalize(text):
+    """fold() without sentence punctuation: "  "The  Mitochondria!" " -> "the mitochondria".
+
+    Only punctuation that doesn't change what the answer says is removed (wrapping quotes and
+    brackets, trailing .!?, commas before a space, hyphens joining words), so "C#", "C++",
+    ".NET" and "==" keep their symbols. Returns '' when nothing but such punctuation is left.
+    """
+    text = _SEPARATING_PUNCTUATION.sub('', _WORD_JOINERS.sub(' ', fold(text)))
+    previous = None
+    while text != previous:
+        previous, text = text, _EDGES.sub('', text).strip()
+    return _WHITESPACE.sub(' ', text)
+
+
+def split_alternatives(spec):
+    spec = spec or ''
+    separator = SEPARATOR if SEPARATOR in spec else LEGACY_SEPARATOR
+    return [part.strip() for part in spec.split(separator) if part.strip()]
+
+
+def parse_number(text):
+    text = fold(text)
+    if _THOUSANDS.match(text):
+        text = text.replace(',', '')
+    if not _NUMERIC_ANSWER.match(text):
+        return None
+    value = float(text)
+    return value if math.isfinite(value) else None
+
+
+def fuzzy_edits(target):
+    """Edits tolerated for a ~target: none for very short words, then 1, then 2."""
+    if len(target) < 4:
+        return 0
+    return 1 if len(target) < 10 else MAX_FUZZY_EDITS
+
+
+def _deletions(text, max_deletions):
+    """`text` and every string obtained by deleting up to `max_deletions` characters."""
+    variants = {text}
+    frontier = {text}
+    for _ in range(max_deletions):
+        frontier = {variant[:i] + variant[i + 1:] for variant in frontier for i in range(len(variant))}
+        variants |= frontier
+    return variants
+
+
+def bounded_edit_distance(a, b, bound):
+    """Levenshtein distance of a and b if it is <= bound, else bound + 1. O(len * bound)."""
+    if abs(len(a) - len(b)) > bound:
+        return bound + 1
+    if len(a) > len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        low, high = max(1, i - bound), min(len(b), i + bound)
+        current = [bound + 1] * (len(b) + 1)
+        current[0] = i if i <= bound else bound + 1
+        for j in range(low, high + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+        if min(current[low - 1:high + 1]) > bound:
+            return bound + 1
+        previous = current
+    return min(previous[len(b)], bound + 1)
+
+
+class AnswerMatcher:
+    """Compiled form of one `correct_answer_text`; call matches(answer)."""
+
+    def __init__(self, spec):
+        self.errors = []  # invalid regexes and alternatives with nothing to match, skipped when matching
+        self.display = []  # text and numeric alternatives as shown to students (see display_answers)
+        self.exact = set()
+        intervals = []
+        patterns = []
+        self.fuzzy_index = {}
+        self.fuzzy_max_length = 0
+        for alternative in split_alternatives(spec):
+            if alternative[:len(REGEX_PREFIX)].lower() == REGEX_PREFIX:
+                pattern = alternative[len(REGEX_PREFIX):].strip()
+                try:
+                    re.compile(pattern)
+                except re.error as e:
+                    self.errors.append(f'invalid regular expression {pattern!r}: {e}')
+                    continue
+                patterns.append(pattern)
+                continue
+            if alternative.startswith(FUZZY_PREFIX):
+                target = normalize(alternative[len(FUZZY_PREFIX):])
+                if not target:
+                    self.errors.append(f'{alternative!r} has no text to match')
+                    continue
+                self.display.append(alternative[len(FUZZY_PREFIX):].strip())
+                self.exact.add(target)
+                edits = fuzzy_edits(target)
+                if edits:
+                    self.fuzzy_max_length = max(self.fuzzy_max_length, len(target) + edits)
+                    for variant in _deletions(target, edits):
+                        self.fuzzy_index.setdefault(variant, set()).add((target, edits))
+                continue
+            numeric = _NUMERIC_SPEC.match(fold(alternative).replace(' ', ''))
+            if numeric:
+                value = float(numeric.group(1))
+                tolerance = float(numeric.group(2) or 0.0)
+                if numeric.group(3):
+                    tolerance = abs(value) * tolerance / 100.0
+                tolerance = max(abs(tolerance), abs(value) * _RELATIVE_EPSILON)
+                intervals.append((value - tolerance, value + tolerance))
+                self.display.append(alternative)
+                continue
+            # Both forms are keys: the folded text keeps every symbol, the normalized one also
+            # accepts "Paris." for "Paris" (matches() tries them in that order)
+            folded, normalized = fold(alternative), normalize(alternative)
+            if not folded:
+                self.errors.append(f'{alternative!r} has no text to match')
+                continue
+            self.exact.add(folded)
+            if normalized:
+                self.exact.add(normalized)
+            self.display.append(alternative)
+        # Intervals sorted by lower bound, with the running max of upper bounds, so one
+        # bisect decides whether any interval contains a number.
+        intervals.sort()
+        self.interval_lows = [low for low, _ in intervals]
+        self.interval_reach = []
+        reach = -math.inf
+        for _, high in intervals:
+            reach = max(reach, high)
+            self.interval_reach.append(reach)
+        self.pattern = self.patterns = None
+        if patterns:
+            try:
+                self.pattern = re.compile('|'.join(f'(?:{p})' for p in patterns), re.IGNORECASE)
+            except re.error:  # e.g. the same group name in two patterns
+                self.patterns = [re.compile(p, re.IGNORECASE) for p in patterns]
+
+    def matches(self, answer):
+        folded = fold(answer)
+        if not folded:
+            return False
+        if folded in self.exact:
+            return True
+        normalized = normalize(answer)
+        if normalized and normalized in self.exact:
+            return True
+        if self.interval_lows:
+            number = parse_number(answer)
+            if number is not None:
+                index = bisect.bisect_right(self.interval_lows, number) - 1
+                if index >= 0 and self.interval_reach[index] >= number:
+                    return True
+        if self.pattern is not None or self.patterns:
+            if self.pattern is not None:
+                if self.pattern.fullmatch(folded):
+                    return True
+            elif any(p.fullmatch(folded) for p in self.patterns):
+                return True
+        if self.fuzzy_index and normalized and len(normalized) <= self.fuzzy_max_length:
+            for variant in _deletions(normalized, MAX_FUZZY_EDITS):
+                for target, edits in self.fuzzy_index.get(variant, ()):
+                    if bounded_edit_distance(normalized, target, edits) <= edits:
+                        return True
+        return False
+
+
+@lru_cache(maxsize=4096)
+def compile_matcher(spec):
+    """Cached AnswerMatcher; a question's text changes when it is edited, so this is per version."""
+    return AnswerMatcher(spec)
+
+
+def display_answers(spec):
+    """The text and numeric alternatives of `spec` without matcher syntax, for showing to students.
+
+    "~" markers are dropped and regular expressions left out, so only answers a student could
+    have typed are listed; alternatives that normalize to the same text are listed once.
+    """
+    shown = {}
+    for alternative in compile_matcher(spec).display:
+        shown.setdefault(normalize(alternative) or alternative, alternative)
+    return list(shown.values())
+
+
+def validate(spec):
+    """None if `spec` is a usable correct_answer_text, else a message for the question author."""
+    if not split_alternatives(spec):
+        return 'at least one acceptable answer is required'
+    errors = compile_matcher(spec).errors  # invalid regexes and alternatives with nothing to match
+    return '; '.join(errors) if errors else None
@@ -1,19 +1,119 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, g, stream_with_context, send_file
 from flask_sqlalchemy import SQLAlchemy
+from markupsafe import Markup
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from datetime import datetime, timedelta
+from functools import wraps, lru_cache
 import os
 import json
+import copy
+import math
+import re
+import random
+import threading
+import time
+import multiprocessing
+import sqlite3
+import zlib
+import tempfile
 import csv
-from io import StringIO
-from sqlalchemy import text
+import click
+from io import StringIO, TextIOWrapper
+from collections import OrderedDict
+import numpy as np
+import item_analysis
+import question_io
+import question_similarity
+import answer_matching
+from sqlalchemy import text, func, and_, or_, event, update
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-here'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///exam.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('EXAM_DATABASE_URI', 'sqlite:///exam.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=7)
 
+# SQLite engine profiles, selected with EXAM_DB_PROFILE. 'production' enables WAL so
+# concurrent submissions don't serialize on the journal lock; individual pragmas can be
+# overridden with EXAM_DB_BUSY_TIMEOUT_MS, EXAM_DB_MMAP_SIZE, EXAM_DB_CACHE_SIZE,
+# EXAM_DB_POOL_SIZE and EXAM_DB_MAX_OVERFLOW.
+DB_PROFILES = {
+    'default': {
+        'journal_mode': None,
+        'synchronous': None,
+        'busy_timeout_ms': 5000,
+        'mmap_size': None,
+        'cache_size': None,
+        'pool_size': 5,
+        'max_overflow': 10,
+    },
+    'production': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout_ms': 15000,
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64000,  # negative = KiB, i.e. ~64 MB page cache per connection
+        'pool_size': 10,
+        'max_overflow': 20,
+    },
+}
+
+def load_db_profile():
+    name = os.environ.get('EXAM_DB_PROFILE', 'default')
+    if name not in DB_PROFILES:
+        raise ValueError(f"Unknown EXAM_DB_PROFILE '{name}'; expected one of {sorted(DB_PROFILES)}")
+    profile = dict(DB_PROFILES[name])
+    overrides = {
+        'busy_timeout_ms': 'EXAM_DB_BUSY_TIMEOUT_MS',
+        'mmap_size': 'EXAM_DB_MMAP_SIZE',
+        'cache_size': 'EXAM_DB_CACHE_SIZE',
+        'pool_size': 'EXAM_DB_POOL_SIZE',
+        'max_overflow': 'EXAM_DB_MAX_OVERFLOW',
+    }
+    for key, env_name in overrides.items():
+        if os.environ.get(env_name):
+            profile[key] = int(os.environ[env_name])
+    return profile
+
+DB_PROFILE = load_db_profile()
+
+def is_sqlite_memory_uri(uri):
+    """In-memory SQLite URIs get a StaticPool, which takes no pool sizing options."""
+    url = make_url(uri)
+    database = url.database or ''
+    return database in ('', ':memory:') or 'mode=memory' in database or url.query.get('mode') == 'memory'
+
+if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_pre_ping': True,
+        'connect_args': {
+            'timeout': DB_PROFILE['busy_timeout_ms'] / 1000.0,
+            'check_same_thread': False,
+        },
+    }
+    if not is_sqlite_memory_uri(app.config['SQLALCHEMY_DATABASE_URI']):
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'].update(pool_size=DB_PROFILE['pool_size'],
+                                                       max_overflow=DB_PROFILE['max_overflow'])
+
+@event.listens_for(Engine, 'connect')
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    if DB_PROFILE['journal_mode']:
+        cursor.execute(f"PRAGMA journal_mode={DB_PROFILE['journal_mode']}")
+    if DB_PROFILE['synchronous']:
+        cursor.execute(f"PRAGMA synchronous={DB_PROFILE['synchronous']}")
+    cursor.execute(f"PRAGMA busy_timeout={int(DB_PROFILE['busy_timeout_ms'])}")
+    if DB_PROFILE['mmap_size'] is not None:
+        cursor.execute(f"PRAGMA mmap_size={int(DB_PROFILE['mmap_size'])}")
+    if DB_PROFILE['cache_size'] is not None:
+        cursor.execute(f"PRAGMA cache_size={int(DB_PROFILE['cache_size'])}")
+    cursor.close()
+
 db = SQLAlchemy(app)
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -40,7 +140,7 @@ class Question(db.Model):
     option_d = db.Column(db.String(200), nullable=False)
     correct_answer = db.Column(db.String(10), nullable=True)  # e.g., 'A' or 'A,B' for multi
     question_type = db.Column(db.String(20), default='mcq_single')  # mcq_single, mcq_multi, short_text
-    correct_answer_text = db.Column(db.Text, nullable=True)  # for short_text, pipe-separated acceptable answers
+    correct_answer_text = db.Column(db.Text, nullable=True)  # for short_text, pipe-separated acceptable answers (syntax in answer_matching.py)
     points = db.Column(db.Float, default=1.0)
     partial_credit = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -50,6 +150,8 @@ class Exam(db.Model):
     name = db.Column(db.String(120), nullable=False)
     domain = db.Column(db.String(20), nullable=False)
     is_visible = db.Column(db.Boolean, default=False)
+    paper_version = db.Column(db.Integer, default=0)  # bumped whenever the paper or one of its questions changes
+    shuffle = db.Column(db.Boolean, default=False)  # per-session question/option order
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class ExamQuestion(db.Model):
@@ -76,6 +178,9 @@ class ExamSession(db.Model):
     is_completed = db.Column(db.Boolean, default=False)
     score = db.Column(db.Float, default=0.0)
     total_questions = db.Column(db.Integer, default=0)
+    item_stats_applied = db.Column(db.Boolean, default=False)  # responses folded into QuestionStat
+    paper_version = db.Column(db.Integer, nullable=True)  # Exam.paper_version frozen at start
+    submitted_at = db.Column(db.DateTime, nullable=True)  # set on submit; is_completed once a worker has graded it
 
 class ExamResponse(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -86,10 +191,231 @@ class ExamResponse(db.Model):
     awarded_points = db.Column(db.Float, default=0.0)
     answered_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+class DraftAnswer(db.Model):
+    __table_args__ = (db.UniqueConstraint('exam_session_id', 'question_id', name='uq_draft_answer_session_question'),)
+    id = db.Column(db.Integer, primary_key=True)
+    exam_session_id = db.Column(db.Integer, db.ForeignKey('exam_session.id'), nullable=False)
+    question_id = db.Column(db.Integer, db.ForeignKey('question.id'), nullable=False)
+    answer = db.Column(db.Text, nullable=False)  # JSON list of submitted form values
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class GradingJob(db.Model):
+    """A submitted session waiting to be graded; deleted in the transaction that grades it."""
+    __table_args__ = (db.Index('ix_grading_job_status_submitted', 'status', 'submitted_at'),)
+    exam_session_id = db.Column(db.Integer, db.ForeignKey('exam_session.id'), primary_key=True)
+    answers = db.Column(db.Text, nullable=False)  # JSON of the submitted question_<id> form values
+    submitted_at = db.Column(db.DateTime, nullable=False)
+    status = db.Column(db.String(10), default='pending')  # pending, running or failed
+    attempts = db.Column(db.Integer, default=0)
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+
+class ExamAggregate(db.Model):
+    """Running per-exam result totals, updated in the same transaction that completes a session."""
+    exam_id = db.Column(db.Integer, db.ForeignKey('exam.id'), primary_key=True)
+    completed_count = db.Column(db.Integer, default=0)
+    unique_students = db.Column(db.Integer, default=0)
+    graded_count = db.Column(db.Integer, default=0)  # completed sessions with total_questions > 0
+    sum_percent = db.Column(db.Float, default=0.0)
+    sum_sq_percent = db.Column(db.Float, default=0.0)
+    sum_score = db.Column(db.Float, default=0.0)
+    sum_questions = db.Column(db.Integer, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ExamScoreBucket(db.Model):
+    exam_id = db.Column(db.Integer, db.ForeignKey('exam.id'), primary_key=True)
+    bucket = db.Column(db.Integer, primary_key=True)  # whole percent, 0-100
+    count = db.Column(db.Integer, default=0)
+
+class ExamLeaderboardEntry(db.Model):
+    """Top LEADERBOARD_SIZE sessions of an exam by percentage."""
+    __table_args__ = (db.Index('ix_exam_leaderboard_rank', 'exam_id', 'percent', 'completed_at'),)
+    id = db.Column(db.Integer, primary_key=True)
+    exam_id = db.Column(db.Integer, db.ForeignKey('exam.id'), nullable=False)
+    session_id = db.Column(db.Integer, db.ForeignKey('exam_session.id'), nullable=False, unique=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    percent = db.Column(db.Float, nullable=False)
+    score = db.Column(db.Float, default=0.0)
+    completed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ExamBlueprintRule(db.Model):
+    """"Draw `count` questions of this type/points from the exam's domain"; None means any."""
+    id = db.Column(db.Integer, primary_key=True)
+    exam_id = db.Column(db.Integer, db.ForeignKey('exam.id'), nullable=False, index=True)
+    question_type = db.Column(db.String(20), nullable=True)
+    points = db.Column(db.Float, nullable=True)
+    count = db.Column(db.Integer, nullable=False, default=1)
+    position = db.Column(db.Integer, default=0)
+
+class QuestionPool(db.Model):
+    """Question count per (domain, type, points) stratum; maintained by triggers on `question`."""
+    domain = db.Column(db.String(20), primary_key=True)
+    question_type = db.Column(db.String(20), primary_key=True)
+    points = db.Column(db.Float, primary_key=True)
+    size = db.Column(db.Integer, nullable=False, default=0)
+
+class QuestionPoolSlot(db.Model):
+    """Dense 0..size-1 numbering of each stratum, so a random question is one index lookup."""
+    domain = db.Column(db.String(20), primary_key=True)
+    question_type = db.Column(db.String(20), primary_key=True)
+    points = db.Column(db.Float, primary_key=True)
+    slot = db.Column(db.Integer, primary_key=True)
+    question_id = db.Column(db.Integer, nullable=False, unique=True)
+
+class SessionPaper(db.Model):
+    """Questions sampled for one session of a blueprint exam (same JSON format as PaperSnapshot)."""
+    exam_session_id = db.Column(db.Integer, db.ForeignKey('exam_session.id'), primary_key=True)
+    payload = db.Column(db.Text, nullable=False)
+
+class PaperSnapshot(db.Model):
+    """Serialized, answer-free question paper of one exam version, shared by its sessions."""
+    exam_id = db.Column(db.Integer, db.ForeignKey('exam.id'), primary_key=True)
+    version = db.Column(db.Integer, primary_key=True)
+    question_count = db.Column(db.Integer, default=0)
+    payload = db.Column(db.Text, nullable=False)  # JSON list of questions in display order
+    shuffle = db.Column(db.Boolean, default=False)
+    sampled = db.Column(db.Boolean, default=False)  # blueprint exam: each session has its own SessionPaper
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class QuestionStat(db.Model):
+    """Running item-analysis sums for a question; see item_analysis.py for the derived statistics."""
+    question_id = db.Column(db.Integer, db.ForeignKey('question.id'), primary_key=True)
+    responses = db.Column(db.Integer, default=0)
+    sum_x = db.Column(db.Float, default=0.0)
+    sum_x2 = db.Column(db.Float, default=0.0)
+    sum_y = db.Column(db.Float, default=0.0)
+    sum_y2 = db.Column(db.Float, default=0.0)
+    sum_xy = db.Column(db.Float, default=0.0)
+    correct_count = db.Column(db.Integer, default=0)
+    option_a_count = db.Column(db.Integer, default=0)
+    option_b_count = db.Column(db.Integer, default=0)
+    option_c_count = db.Column(db.Integer, default=0)
+    option_d_count = db.Column(db.Integer, default=0)
+    timed_count = db.Column(db.Integer, default=0)
+    sum_seconds = db.Column(db.Float, default=0.0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @property
+    def p_value(self):
+        return float(item_analysis.p_value(self.responses, self.sum_x))
+
+    @property
+    def discrimination(self):
+        return float(item_analysis.discrimination(self.responses, self.sum_x, self.sum_x2,
+                                                  self.sum_y, self.sum_y2, self.sum_xy))
+
+    @property
+    def mean_seconds(self):
+        return float(item_analysis.mean_seconds(self.timed_count, self.sum_seconds))
+
+    @property
+    def option_frequencies(self):
+        counts = {'A': self.option_a_count, 'B': self.option_b_count, 'C': self.option_c_count, 'D': self.option_d_count}
+        total = sum(counts.values())
+        return {letter: (count / total if total else 0.0) for letter, count in counts.items()}
+
+class QuestionSignature(db.Model):
+    """MinHash signature of a question's text and options; see question_similarity.py."""
+    question_id = db.Column(db.Integer, db.ForeignKey('question.id'), primary_key=True)
+    domain = db.Column(db.String(20), nullable=False)
+    signature = db.Column(db.LargeBinary, nullable=False)
+
+class QuestionLshBucket(db.Model):
+    """LSH band bucket of a signature; questions sharing a bucket in a domain are duplicate candidates."""
+    domain = db.Column(db.String(20), primary_key=True)
+    bucket = db.Column(db.BigInteger, primary_key=True)
+    question_id = db.Column(db.Integer, db.ForeignKey('question.id'), primary_key=True, index=True)
+    __table_args__ = {'sqlite_with_rowid': False}
+
+class PendingQuestionSignature(db.Model):
+    """Question whose signature is missing or stale; filled by triggers, drained by update_similarity_index."""
+    question_id = db.Column(db.Integer, primary_key=True)
+
+SCORE_BUCKETS = 101
+LEADERBOARD_SIZE = 20
+# When a session was handed in; end_time is only the scheduled deadline (start + 30 min)
+# and stands in for sessions submitted before submitted_at was recorded
+SESSION_COMPLETED_AT = func.coalesce(ExamSession.submitted_at, ExamSession.end_time)
+LEADERBOARD_ORDER = (ExamLeaderboardEntry.percent.desc(), ExamLeaderboardEntry.completed_at.asc(), ExamLeaderboardEntry.session_id.asc())
+
 @login_manager.user_loader
 def load_user(user_id):
     return User.query.get(int(user_id))
 
+class AdminScope:
+    """The logged-in admin's record and the domains they may manage."""
+
+    def __init__(self, admin_info, domains):
+        self.admin_info = admin_info
+        self.domains = domains
+        self._domain_set = frozenset(domains)
+        self.is_super_admin = admin_info.get('domain') == 'all'
+
+    def allows(self, domain):
+        return domain in self._domain_set
+
+    def domain_filter(self, column):
+        """SQL filter restricting `column` (e.g. Exam.domain) to this admin's domains."""
+        return column.in_(self.domains)
+
+def get_admin_scope():
+    """Resolve the session admin's scope once per request and cache it on flask.g."""
+    if 'admin_scope' not in g:
+        admin_info = admin_registry.get(session.get('admin_user'))
+        if admin_info:
+            g.admin_scope = AdminScope(admin_info, admin_registry.allowed_domains(admin_info['username']))
+        else:
+            g.admin_scope = None
+    return g.admin_scope
+
+def admin_required(domain_from=None, denied_message='Not allowed.', denied_redirect='admin_dashboard_json'):
+    """Require a logged-in admin and, optionally, access to the domain of the target resource.
+
+    `domain_from` receives the view's URL arguments and returns the domain being accessed.
+    `denied_redirect` is an endpoint name or a callable taking that domain and returning a URL.
+    The resolved AdminScope is available to the view via get_admin_scope().
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            if not session.get('admin_user'):
+                flash('Please log in as admin.', 'error')
+                return redirect(url_for('admin_login'))
+            scope = get_admin_scope()
+            if scope is None:
+                session.pop('admin_user', None)
+                session.pop('admin_domains', None)
+                flash('Admin account not found. Please log in again.', 'error')
+                return redirect(url_for('admin_login'))
+            if domain_from is not None:
+                domain = domain_from(**kwargs)
+                if not scope.allows(domain):
+                    flash(denied_message, 'error')
+                    if callable(denied_redirect):
+                        return redirect(denied_redirect(domain))
+                    return redirect(url_for(denied_redirect))
+            return view(*args, **kwargs)
+        return wrapped
+    return decorator
+
+def exam_domain(exam_id, **_):
+    return Exam.query.get_or_404(exam_id).domain
+
+def question_domain(question_id, **_):
+    return Question.query.get_or_404(question_id).domain
+
+def session_domain(session_id, **_):
+    return ExamSession.query.get_or_404(session_id).domain
+
+def url_domain(domain, **_):
+    return domain
+
+def admin_exams_url(domain):
+    return url_for('admin_exams', domain=domain)
+
+def admin_questions_url(domain):
+    return url_for('admin_questions', domain=domain)
+
 # Routes
 @app.route('/')
 def index():
@@ -151,127 +477,228 @@ def logout():
 
 # Session-based admin results route
 @app.route('/admin/results')
+@admin_required()
 def admin_results():
-    if not session.get('admin_user'):
-        flash('Please log in as admin.', 'error')
-        return redirect(url_for('admin_login'))
-    admins = load_admins()
-    admin_info = next((a for a in admins if a.get('username') == session.get('admin_user')), None)
-    if not admin_info:
-        session.pop('admin_user', None)
-        session.pop('admin_domains', None)
-        flash('Admin account not found. Please log in again.', 'error')
-        return redirect(url_for('admin_login'))
-    all_domains = ['web_dev', 'ml', 'data_science']
-    admin_domains = admin_info.get('domain', [])
-    if isinstance(admin_domains, str):
-        if admin_domains == 'all':
-            allowed_domains = all_domains
-        else:
-            allowed_domains = [admin_domains]
-    else:
-        allowed_domains = admin_domains if admin_domains else all_domains
-    # Determine if this is a super admin (can see all domains)
-    if isinstance(admin_domains, str):
-        is_super_admin = admin_domains == 'all'
-    else:
-        is_super_admin = False
+    scope = get_admin_scope()
     # Show list of exams first (conducted in allowed domains)
-    exams = Exam.query.filter(Exam.domain.in_(allowed_domains)).order_by(Exam.created_at.desc()).all()
-    exams_with_counts = []
-    for e in exams:
-        count = ExamSession.query.filter_by(exam_id=e.id, is_completed=True).count()
-        exams_with_counts.append({'exam': e, 'completed_count': count})
+    # Completed-attempt counts come from one grouped subquery joined onto the exam list
+    completed_counts = (db.session.query(ExamSession.exam_id, func.count(ExamSession.id).label('completed_count'))
+                        .filter(ExamSession.is_completed == True, ExamSession.exam_id.isnot(None))
+                        .group_by(ExamSession.exam_id)
+                        .subquery())
+    rows = (db.session.query(Exam, func.coalesce(completed_counts.c.completed_count, 0))
+            .outerjoin(completed_counts, completed_counts.c.exam_id == Exam.id)
+            .filter(scope.domain_filter(Exam.domain))
+            .order_by(Exam.created_at.desc())
+            .all())
+    exams_with_counts = [{'exam': e, 'completed_count': count} for e, count in rows]
     return render_template('admin_results_exams.html', exams_with_counts=exams_with_counts)
 
+RESULTS_PER_PAGE = 50
+
+class ExamResultStats:
+    """Aggregate statistics for an exam's completed sessions, read from the materialized aggregates."""
+
+    def __init__(self, total_sessions=0, unique_students=0, graded_sessions=0, mean_percent=0.0,
+                 std_dev_percent=0.0, percentiles=None, distribution=None, domain_counts=None,
+                 domain_avg_percent=None):
+        self.total_sessions = total_sessions
+        self.unique_students = unique_students
+        self.graded_sessions = graded_sessions
+        self.mean_percent = mean_percent
+        self.std_dev_percent = std_dev_percent
+        self.percentiles = percentiles or {}
+        self.distribution = distribution or {'excellent': 0, 'good': 0, 'fair': 0, 'poor': 0}
+        self.domain_counts = domain_counts or {}
+        self.domain_avg_percent = domain_avg_percent or {d: 0.0 for d in ALL_DOMAINS}
+
+    @property
+    def median_percent(self):
+        return self.percentiles.get(50, 0.0)
+
+def score_bucket(percent):
+    """Whole-percent histogram bucket (0-100) for a session percentage."""
+    return int(math.floor(min(max(percent, 0.0), 100.0)))
+
+def histogram_percentile(histogram, total, p):
+    """Percentile estimated from whole-percent buckets (each session counted at its bucket's
+    lower edge), interpolating between neighbouring ranks like the exact computation."""
+    if total <= 0:
+        return 0.0
+    rank = (p / 100.0) * (total - 1)
+    lower, upper = int(math.floor(rank)), int(math.ceil(rank))
+
+    def value_at(index):
+        seen = 0
+        for bucket in range(SCORE_BUCKETS):
+            seen += histogram.get(bucket, 0)
+            if seen > index:
+                return float(bucket)
+        return 100.0
+
+    low = value_at(lower)
+    return round(low + (value_at(upper) - low) * (rank - lower), 1)
+
+def load_exam_aggregate(exam_id):
+    """An exam's aggregates, rebuilt in the current transaction if missing (the request commits)."""
+    aggregate = db.session.get(ExamAggregate, exam_id)
+    if aggregate is None:
+        rebuild_exam_aggregates(exam_id)
+        aggregate = db.session.get(ExamAggregate, exam_id)
+    return aggregate
+
+def compute_exam_result_stats(exam, percentile_points=(25, 50, 75, 90)):
+    aggregate = load_exam_aggregate(exam.id)
+    histogram = dict(db.session.query(ExamScoreBucket.bucket, ExamScoreBucket.count)
+                     .filter_by(exam_id=exam.id).all())
+    graded = aggregate.graded_count or 0
+    mean = (aggregate.sum_percent or 0.0) / graded if graded else 0.0
+    variance = max((aggregate.sum_sq_percent or 0.0) / graded - mean * mean, 0.0) if graded else 0.0
+
+    def bucket_range(lo, hi):
+        return sum(count for bucket, count in histogram.items() if lo <= bucket < hi)
+
+    domain_avg_percent = {d: 0.0 for d in ALL_DOMAINS}
+    if aggregate.sum_questions:
+        domain_avg_percent[exam.domain] = round((aggregate.sum_score or 0.0) / aggregate.sum_questions * 100.0, 1)
+    return ExamResultStats(
+        total_sessions=aggregate.completed_count or 0,
+        unique_students=aggregate.unique_students or 0,
+        graded_sessions=graded,
+        mean_percent=round(mean, 1),
+        std_dev_percent=round(math.sqrt(variance), 1),
+        percentiles={p: histogram_percentile(histogram, graded, p) for p in percentile_points},
+        distribution={'excellent': bucket_range(90, SCORE_BUCKETS), 'good': bucket_range(70, 90),
+                      'fair': bucket_range(50, 70), 'poor': bucket_range(0, 50)},
+        domain_counts={exam.domain: aggregate.completed_count or 0},
+        domain_avg_percent=domain_avg_percent,
+    )
+
+def record_exam_result(exam_session, completed_at):
+    """Fold a just-completed session into its exam's aggregates, histogram and leaderboard.
+
+    Only issues atomic SQL increments/upserts, so it is safe to run inside submit_exam's
+    transaction alongside other workers doing the same.
+    """
+    exam_id = exam_session.exam_id
+    tq = exam_session.total_questions or 0
+    score = exam_session.score or 0.0
+    graded = tq > 0
+    percent = score * 100.0 / tq if graded else 0.0
+    first_completion = not db.session.query(
+        ExamSession.query.filter(ExamSession.exam_id == exam_id, ExamSession.user_id == exam_session.user_id,
+                                 ExamSession.is_completed == True, ExamSession.id != exam_session.id).exists()
+    ).scalar()
+    table = ExamAggregate.__table__
+    increments = {
+        'completed_count': 1,
+        'unique_students': 1 if first_completion else 0,
+        'graded_count': 1 if graded else 0,
+        'sum_percent': percent if graded else 0.0,
+        'sum_sq_percent': percent * percent if graded else 0.0,
+        'sum_score': score if graded else 0.0,
+        'sum_questions': tq if graded else 0,
+    }
+    stmt = sqlite_insert(table).values(exam_id=exam_id, updated_at=completed_at, **increments)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['exam_id'],
+        set_={**{name: func.coalesce(table.c[name], 0) + stmt.excluded[name] for name in increments},
+              'updated_at': stmt.excluded.updated_at})
+    db.session.execute(stmt)
+    if not graded:
+        return
+    bucket_stmt = sqlite_insert(ExamScoreBucket.__table__).values(exam_id=exam_id, bucket=score_bucket(percent), count=1)
+    db.session.execute(bucket_stmt.on_conflict_do_update(
+        index_elements=['exam_id', 'bucket'],
+        set_={'count': ExamScoreBucket.__table__.c.count + 1}))
+    db.session.add(ExamLeaderboardEntry(exam_id=exam_id, session_id=exam_session.id, user_id=exam_session.user_id,
+                                        percent=percent, score=score, completed_at=completed_at))
+    db.session.flush()
+    trim_leaderboard(exam_id)
+
+def trim_leaderboard(exam_id):
+    keep = (db.session.query(ExamLeaderboardEntry.id)
+            .filter(ExamLeaderboardEntry.exam_id == exam_id)
+            .order_by(*LEADERBOARD_ORDER)
+            .limit(LEADERBOARD_SIZE))
+    (ExamLeaderboardEntry.query
+     .filter(ExamLeaderboardEntry.exam_id == exam_id, ~ExamLeaderboardEntry.id.in_(keep.scalar_subquery()))
+     .delete(synchronize_session=False))
+
+def rebuild_exam_aggregates(exam_id):
+    """Recompute an exam's materialized aggregates from its sessions (backfill / repair).
+
+    Runs in the caller's transaction and only flushes; the caller commits.
+    """
+    # Take the write lock first so a concurrent submit can't land between the reads and the rewrite
+    db.session.execute(text("UPDATE exam_aggregate SET exam_id = exam_id WHERE 0"))
+    completed = ExamSession.query.filter(ExamSession.is_completed == True, ExamSession.exam_id == exam_id)
+    graded = ExamSession.total_questions > 0
+    pct = ExamSession.score * 100.0 / ExamSession.total_questions
+    total, unique_students = completed.with_entities(func.count(ExamSession.id),
+                                                     func.count(func.distinct(ExamSession.user_id))).one()
+    graded_count, sum_percent, sum_sq_percent, sum_score, sum_questions = completed.filter(graded).with_entities(
+        func.count(ExamSession.id), func.sum(pct), func.sum(pct * pct),
+        func.sum(ExamSession.score), func.sum(ExamSession.total_questions)).one()
+    ExamAggregate.query.filter_by(exam_id=exam_id).delete()
+    ExamScoreBucket.query.filter_by(exam_id=exam_id).delete()
+    ExamLeaderboardEntry.query.filter_by(exam_id=exam_id).delete()
+    db.session.add(ExamAggregate(exam_id=exam_id, completed_count=total or 0, unique_students=unique_students or 0,
+                                 graded_count=graded_count or 0, sum_percent=sum_percent or 0.0,
+                                 sum_sq_percent=sum_sq_percent or 0.0, sum_score=sum_score or 0.0,
+                                 sum_questions=sum_questions or 0, updated_at=datetime.utcnow()))
+    bucket_expr = func.max(0, func.min(100, func.cast(pct, db.Integer)))
+    for bucket, count in completed.filter(graded).with_entities(bucket_expr, func.count(ExamSession.id)).group_by(bucket_expr).all():
+        db.session.add(ExamScoreBucket(exam_id=exam_id, bucket=bucket, count=count))
+    top = (completed.filter(graded)
+           .with_entities(ExamSession.id, ExamSession.user_id, pct, ExamSession.score, SESSION_COMPLETED_AT)
+           .order_by(pct.desc(), SESSION_COMPLETED_AT.asc(), ExamSession.id.asc())
+           .limit(LEADERBOARD_SIZE).all())
+    for sid, uid, percent, score, completed_at in top:
+        db.session.add(ExamLeaderboardEntry(exam_id=exam_id, session_id=sid, user_id=uid, percent=percent,
+                                            score=score, completed_at=completed_at))
+    db.session.flush()
+
+def exam_leaderboard(exam_id, limit=LEADERBOARD_SIZE):
+    return (db.session.query(ExamLeaderboardEntry, User.username)
+            .outerjoin(User, User.id == ExamLeaderboardEntry.user_id)
+            .filter(ExamLeaderboardEntry.exam_id == exam_id)
+            .order_by(*LEADERBOARD_ORDER)
+            .limit(limit)
+            .all())
+
 @app.route('/admin/results/exam/<int:exam_id>')
+@admin_required(domain_from=exam_domain, denied_message='You are not allowed to view results for this exam.', denied_redirect='admin_results')
 def admin_results_exam(exam_id):
-    if not session.get('admin_user'):
-        flash('Please log in as admin.', 'error')
-        return redirect(url_for('admin_login'))
-    admins = load_admins()
-    admin_info = next((a for a in admins if a.get('username') == session.get('admin_user')), None)
-    if not admin_info:
-        session.pop('admin_user', None)
-        session.pop('admin_domains', None)
-        flash('Admin account not found. Please log in again.', 'error')
-        return redirect(url_for('admin_login'))
-    all_domains = ['web_dev', 'ml', 'data_science']
-    admin_domains = admin_info.get('domain', [])
-    if isinstance(admin_domains, str):
-        if admin_domains == 'all':
-            allowed_domains = all_domains
-        else:
-            allowed_domains = [admin_domains]
-    else:
-        allowed_domains = admin_domains if admin_domains else all_domains
     exam = Exam.query.get_or_404(exam_id)
-    if exam.domain not in allowed_domains:
-        flash('You are not allowed to view results for this exam.', 'error')
-        return redirect(url_for('admin_results'))
-    exam_sessions = ExamSession.query.filter(
-        ExamSession.is_completed == True,
-        ExamSession.exam_id == exam.id
-    ).all()
     # Only super admin sees domain performance; domain admins see score distribution only
-    if isinstance(admin_domains, str):
-        is_super_admin = admin_domains == 'all'
-    else:
-        is_super_admin = False
-    unique_students_count = len({s.user_id for s in exam_sessions})
-    def domain_avg_percent(domain: str) -> float:
-        domain_sessions = [s for s in exam_sessions if s.domain == domain and (s.total_questions or 0) > 0]
-        if not domain_sessions:
-            return 0.0
-        total_correct = sum(s.score or 0 for s in domain_sessions)
-        total_questions = sum(s.total_questions or 0 for s in domain_sessions)
-        if total_questions <= 0:
-            return 0.0
-        return round((total_correct / total_questions) * 100.0, 1)
-    avg_percentages = {
-        'web_dev': domain_avg_percent('web_dev'),
-        'ml': domain_avg_percent('ml'),
-        'data_science': domain_avg_percent('data_science'),
-    }
-    excellent = 0
-    good = 0
-    fair = 0
-    poor = 0
-    for s in exam_sessions:
-        tq = s.total_questions or 0
-        if tq <= 0:
-            continue
-        pct = (float(s.score or 0) / float(tq)) * 100.0
-        if pct >= 90:
-            excellent += 1
-        elif pct >= 70:
-            good += 1
-        elif pct >= 50:
-            fair += 1
-        else:
-            poor += 1
-    distribution = {
-        'excellent': excellent,
-        'good': good,
-        'fair': fair,
-        'poor': poor,
-    }
-    # Build student list for retake controls (unique students)
-    student_ids = sorted({s.user_id for s in exam_sessions})
-    students = [User.query.get(uid) for uid in student_ids]
-    retake_map = {p.user_id: p for p in ExamRetakePermission.query.filter_by(exam_id=exam.id).all()}
-    return render_template('admin_results.html', exam_sessions=exam_sessions, unique_students_count=unique_students_count, avg_percentages=avg_percentages, distribution=distribution, exam=exam, show_domain_performance=is_super_admin, students=students, retake_map=retake_map)
+    is_super_admin = get_admin_scope().is_super_admin
+    stats = compute_exam_result_stats(exam)
+    leaderboard = exam_leaderboard(exam.id)
+    db.session.commit()  # keeps aggregates rebuilt by compute_exam_result_stats
+    page = request.args.get('page', 1, type=int)
+    completed = ExamSession.query.filter(ExamSession.is_completed == True, ExamSession.exam_id == exam.id)
+    # Session rows carry the student's username in the same query
+    sessions_page = (completed
+                     .outerjoin(User, User.id == ExamSession.user_id)
+                     .add_columns(User.username)
+                     .order_by(ExamSession.end_time.desc(), ExamSession.id.desc())
+                     .paginate(page=page, per_page=RESULTS_PER_PAGE, error_out=False))
+    # Student list for retake controls (unique students) with their retake permissions, in one query
+    students = (completed
+                .with_entities(ExamSession.user_id.label('id'), User.username, User.email,
+                               ExamRetakePermission.remaining_attempts)
+                .outerjoin(User, User.id == ExamSession.user_id)
+                .outerjoin(ExamRetakePermission, and_(ExamRetakePermission.user_id == ExamSession.user_id,
+                                                      ExamRetakePermission.exam_id == exam.id))
+                .distinct()
+                .order_by(ExamSession.user_id)
+                .all())
+    return render_template('admin_results.html', stats=stats, leaderboard=leaderboard, sessions_page=sessions_page, exam=exam, show_domain_performance=is_super_admin, students=students)
 
 @app.route('/admin/exam/<int:exam_id>/retake', methods=['POST'])
+@admin_required(domain_from=exam_domain, denied_message='You are not allowed to manage retakes for this exam.', denied_redirect='admin_results')
 def admin_grant_retake(exam_id):
-    if not session.get('admin_user'):
-        flash('Please log in as admin.', 'error')
-        return redirect(url_for('admin_login'))
-    admins = load_admins()
-    admin_info = next((a for a in admins if a.get('username') == session.get('admin_user')), None)
-    if not admin_info:
-        flash('Admin account not found.', 'error')
-        return redirect(url_for('admin_login'))
     exam = Exam.query.get_or_404(exam_id)
     user_id = int(request.form.get('user_id'))
     attempts = int(request.form.get('attempts') or '1')
@@ -286,6 +713,71 @@ def admin_grant_retake(exam_id):
     flash('Retake permission updated.', 'success')
     return redirect(url_for('admin_results_exam', exam_id=exam.id))
 
+def load_draft_answers(session_id, with_times=False):
+    """Autosaved answers for a session as {question_id: [form values]}.
+
+    With `with_times`, also returns {question_id: time the draft was last saved}.
+    """
+    rows = (db.session.query(DraftAnswer.question_id, DraftAnswer.answer, DraftAnswer.updated_at)
+            .filter_by(exam_session_id=session_id).all())
+    drafts = {qid: json.loads(answer) for qid, answer, _ in rows}
+    if with_times:
+        return drafts, {qid: updated_at for qid, _, updated_at in rows}
+    return drafts
+
+def normalize_draft_value(value):
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        values = [str(v) for v in value if v is not None]
+    else:
+        values = [str(value)]
+    return [v for v in values if v.strip()]
+
+@app.route('/api/autosave/<int:session_id>', methods=['POST'])
+@login_required
+def autosave_answers(session_id):
+    exam_session = ExamSession.query.get_or_404(session_id)
+    if exam_session.user_id != current_user.id:
+        return jsonify({'error': 'Access denied'}), 403
+    if exam_session.is_completed or exam_session.submitted_at:
+        return jsonify({'error': 'Exam already submitted'}), 409
+    if datetime.utcnow() > exam_session.end_time:
+        return jsonify({'time_expired': True}), 409
+    payload = request.get_json(silent=True) or {}
+    deltas = payload.get('answers')
+    if not isinstance(deltas, dict):
+        return jsonify({'error': 'Expected {"answers": {question_id: value}}'}), 400
+    answer_key = answer_key_for_session(exam_session)
+    now = datetime.utcnow()
+    upserts = []
+    cleared = []
+    for raw_qid, value in deltas.items():
+        try:
+            qid = int(raw_qid)
+        except (TypeError, ValueError):
+            continue
+        if qid not in answer_key:
+            continue
+        values = normalize_draft_value(value)
+        if values:
+            upserts.append({'exam_session_id': session_id, 'question_id': qid,
+                            'answer': json.dumps(values), 'updated_at': now})
+        else:
+            cleared.append(qid)
+    if upserts:
+        stmt = sqlite_insert(DraftAnswer.__table__).values(upserts)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['exam_session_id', 'question_id'],
+            set_={'answer': stmt.excluded.answer, 'updated_at': stmt.excluded.updated_at})
+        db.session.execute(stmt)
+    if cleared:
+        (DraftAnswer.query
+         .filter(DraftAnswer.exam_session_id == session_id, DraftAnswer.question_id.in_(cleared))
+         .delete(synchronize_session=False))
+    db.session.commit()
+    return jsonify({'saved': len(upserts), 'cleared': len(cleared), 'saved_at': now.isoformat()})
+
 @app.route('/api/exam_time/<int:session_id>')
 @login_required
 def exam_time(session_id):
@@ -311,9 +803,8 @@ def admin_login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
-        admins = load_admins()
-        admin = next((a for a in admins if a.get('username') == username and a.get('password') == password), None)
-        if admin:
+        admin = admin_registry.get(username)
+        if admin and admin.get('password') == password:
             session.permanent = True
             session['admin_user'] = admin.get('username')
             session['admin_domains'] = admin.get('domain')
@@ -331,85 +822,106 @@ def admin_logout():
     return redirect(url_for('admin_login'))
 
 @app.route('/admin/dashboard_json')
+@admin_required()
 def admin_dashboard_json():
-    if not session.get('admin_user'):
-        flash('Please log in as admin.', 'error')
-        return redirect(url_for('admin_login'))
-    admins = load_admins()
-    admin_info = next((a for a in admins if a.get('username') == session.get('admin_user')), None)
-    if not admin_info:
-        session.pop('admin_user', None)
-        session.pop('admin_domains', None)
-        flash('Admin account not found. Please log in again.', 'error')
-        return redirect(url_for('admin_login'))
-    all_domains = ['web_dev', 'ml', 'data_science']
-    admin_domains = admin_info.get('domain', [])
-    if isinstance(admin_domains, str):
-        if admin_domains == 'all':
-            allowed_domains = all_domains
-        else:
-            allowed_domains = [admin_domains]
+    scope = get_admin_scope()
+    return render_template('admin_dashboard.html', domains=scope.domains, admin_info=scope.admin_info)
+
+QUESTION_PAGE_SIZE = 50
+
+class QuestionPage:
+    """One keyset page of questions (newest first) plus the cursors and filters to build links."""
+
+    def __init__(self, items, filters, next_after=None, prev_before=None):
+        self.items = items
+        self.filters = filters
+        self.next_after = next_after
+        self.prev_before = prev_before
+
+def fts_match_query(search):
+    """User input as an FTS5 query: every word must appear, as a prefix, with syntax characters dropped."""
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', search))
+
+def question_bank_page(query, args, page_size=QUESTION_PAGE_SIZE):
+    """Filter `query` by ?type=, ?points= and ?q= (full-text) and return the page after ?after= / before ?before=.
+
+    Pages are keyed on Question.id, so every page costs the same no matter how deep it is.
+    """
+    filters = {key: (args.get(key) or '').strip() for key in ('type', 'points', 'q')}
+    if filters['type'] in BLUEPRINT_QUESTION_TYPES:
+        query = query.filter(Question.question_type == filters['type'])
     else:
-        allowed_domains = admin_domains if admin_domains else all_domains
-    return render_template('admin_dashboard.html', domains=allowed_domains, admin_info=admin_info)
+        filters['type'] = ''
+    try:
+        if filters['points']:
+            query = query.filter(Question.points == float(filters['points']))
+    except ValueError:
+        filters['points'] = ''
+    if filters['q']:
+        if question_fts_enabled:
+            match = fts_match_query(filters['q'])
+            if match:
+                query = query.filter(Question.id.in_(
+                    text("SELECT rowid FROM question_fts WHERE question_fts MATCH :match")
+                    .bindparams(match=match).columns(rowid=db.Integer)))
+        else:
+            query = query.filter(Question.question_text.ilike(f"%{filters['q']}%"))
+    after = args.get('after', type=int)
+    before = args.get('before', type=int)
+    if before is not None:
+        rows = query.filter(Question.id > before).order_by(Question.id.asc()).limit(page_size + 1).all()
+        has_more = len(rows) > page_size
+        items = list(reversed(rows[:page_size]))
+        return QuestionPage(items, filters, next_after=items[-1].id if items else None,
+                            prev_before=items[0].id if items and has_more else None)
+    if after is not None:
+        query = query.filter(Question.id < after)
+    rows = query.order_by(Question.id.desc()).limit(page_size + 1).all()
+    items = rows[:page_size]
+    return QuestionPage(items, filters, next_after=items[-1].id if len(rows) > page_size else None,
+                        prev_before=items[0].id if items and after is not None else None)
 
 @app.route('/admin/questions/<domain>')
+@admin_required(domain_from=url_domain, denied_message='You are not allowed to view questions for this domain.')
 def admin_questions(domain):
-    if not session.get('admin_user'):
-        flash('Please log in as admin.', 'error')
-        return redirect(url_for('admin_login'))
-    admins = load_admins()
-    admin_info = next((a for a in admins if a.get('username') == session.get('admin_user')), None)
-    if not admin_info:
-        session.pop('admin_user', None)
-        session.pop('admin_domains', None)
-        flash('Admin account not found. Please log in again.', 'error')
-        return redirect(url_for('admin_login'))
-    all_domains = ['web_dev', 'ml', 'data_science']
-    admin_domains = admin_info.get('domain', [])
-    if isinstance(admin_domains, str):
-        if admin_domains == 'all':
-            allowed_domains = all_domains
-        else:
-            allowed_domains = [admin_domains]
-    else:
-        allowed_domains = admin_domains if admin_domains else all_domains
-    if domain not in allowed_domains:
-        flash('You are not allowed to view questions for this domain.', 'error')
-        return redirect(url_for('admin_dashboard_json'))
-    questions = Question.query.filter_by(domain=domain).all()
-    return render_template('admin_questions.html', questions=questions, domain=domain)
+    page = question_bank_page(Question.query.filter_by(domain=domain), request.args)
+    questions = page.items
+    question_ids = [q.id for q in questions]
+    item_stats = {}
+    if question_ids:
+        item_stats = {st.question_id: st for st in QuestionStat.query.filter(QuestionStat.question_id.in_(question_ids)).all()}
+    return render_template('admin_questions.html', questions=questions, page=page, domain=domain, item_stats=item_stats,
+                           question_types=BLUEPRINT_QUESTION_TYPES)
+
+def flag_similar_questions(question):
+    """Sign a just-flushed question and return its near-duplicates in the domain."""
+    signature = index_question_signatures([question])[question.id]
+    return find_similar_questions(question.domain, signature, exclude_id=question.id)
+
+def flash_similar_questions(question, similar):
+    if similar:
+        matches = ', '.join(f'#{q.id} ({score:.0%})' for q, score in similar)
+        flash(Markup('Possible duplicate of {}. <a href="{}">Review duplicates</a>').format(
+            matches, url_for('question_duplicates', domain=question.domain)), 'warning')
 
 @app.route('/admin/add_question', methods=['GET', 'POST'])
+@admin_required()
 def add_question():
-    if not session.get('admin_user'):
-        flash('Please log in as admin.', 'error')
-        return redirect(url_for('admin_login'))
-    admins = load_admins()
-    admin_info = next((a for a in admins if a.get('username') == session.get('admin_user')), None)
-    if not admin_info:
-        session.pop('admin_user', None)
-        session.pop('admin_domains', None)
-        flash('Admin account not found. Please log in again.', 'error')
-        return redirect(url_for('admin_login'))
-    all_domains = ['web_dev', 'ml', 'data_science']
-    admin_domains = admin_info.get('domain', [])
-    if isinstance(admin_domains, str):
-        if admin_domains == 'all':
-            allowed_domains = all_domains
-        else:
-            allowed_domains = [admin_domains]
-    else:
-        allowed_domains = admin_domains if admin_domains else all_domains
+    scope = get_admin_scope()
     if request.method == 'POST':
-        if request.form['domain'] not in allowed_domains:
+        if not scope.allows(request.form['domain']):
             flash('You are not allowed to add questions for this domain.', 'error')
             return redirect(url_for('add_question'))
+        update_similarity_index(max_questions=SIMILARITY_BATCH_QUESTIONS)  # so the duplicate check sees recent imports
         q_type = request.form.get('question_type', 'mcq_single')
         points = float(request.form.get('points', '1') or 1)
         partial_credit = request.form.get('partial_credit', '1') == '1'
         if q_type == 'short_text':
             correct_text = (request.form.get('correct_answer_text') or '').strip()
+            error = answer_matching.validate(correct_text)
+            if error:
+                flash(f'Acceptable answers: {error}.', 'error')
+                return redirect(url_for('add_question'))
             # Use empty string to satisfy existing NOT NULL constraints on some DBs
             correct_ans = ''
             option_a = ''
@@ -437,18 +949,19 @@ def add_question():
             partial_credit=partial_credit
         )
         db.session.add(question)
+        db.session.flush()
+        similar = flag_similar_questions(question)
         db.session.commit()
         flash('Question added successfully!', 'success')
+        flash_similar_questions(question, similar)
         return redirect(url_for('admin_questions', domain=request.form['domain']))
-    return render_template('add_question.html', domains=allowed_domains)
+    return render_template('add_question.html', domains=scope.domains)
 
 @app.route('/admin/manage_admins', methods=['GET', 'POST'])
+@admin_required()
 def manage_admins():
-    if 'admin_user' not in session:
-        flash('Please log in as admin.', 'error')
-        return redirect(url_for('admin_login'))
     admins = load_admins()
-    all_domains = ['web_dev', 'ml', 'data_science']
+    all_domains = list(ALL_DOMAINS)
     if request.method == 'POST':
         action = request.form.get('action')
         if action == 'add':
@@ -458,7 +971,7 @@ def manage_admins():
             domains = request.form.getlist('domains')
             if not domains:
                 domains = [request.form.get('domain', 'all')]
-            if any(a['username'] == username or a['email'] == email for a in admins):
+            if admin_registry.get(username) or admin_registry.get_by_email(email):
                 flash('Admin with this username or email already exists.', 'error')
             else:
                 new_admin = {
@@ -507,10 +1020,8 @@ def manage_admins():
     return render_template('manage_admins.html', admins=admins, all_domains=all_domains)
 
 @app.route('/admin/pending_students', methods=['GET', 'POST'])
+@admin_required()
 def pending_students():
-    if 'admin_user' not in session:
-        flash('Please log in as admin.', 'error')
-        return redirect(url_for('admin_login'))
     if request.method == 'POST':
         action = request.form.get('action')
         uid = request.form.get('user_id')
@@ -531,29 +1042,18 @@ def pending_students():
     return render_template('pending_students.html', pending=pending)
 
 @app.route('/admin/question/<int:question_id>/edit', methods=['GET', 'POST'])
+@admin_required(domain_from=question_domain, denied_message='Not allowed to edit this question.', denied_redirect=admin_questions_url)
 def edit_question(question_id):
-    if not session.get('admin_user'):
-        flash('Please log in as admin.', 'error')
-        return redirect(url_for('admin_login'))
-    admins = load_admins()
-    admin_info = next((a for a in admins if a.get('username') == session.get('admin_user')), None)
-    if not admin_info:
-        flash('Admin account not found.', 'error')
-        return redirect(url_for('admin_login'))
     question = Question.query.get_or_404(question_id)
-    # Domain restriction
-    allowed = admin_info.get('domain', 'all')
-    if isinstance(allowed, str):
-        if allowed != 'all' and question.domain != allowed:
-            flash('Not allowed to edit this question.', 'error')
-            return redirect(url_for('admin_questions', domain=question.domain))
-    else:
-        if allowed and question.domain not in allowed:
-            flash('Not allowed to edit this question.', 'error')
-            return redirect(url_for('admin_questions', domain=question.domain))
     if request.method == 'POST':
-        question.question_text = request.form['question_text']
+        update_similarity_index(max_questions=SIMILARITY_BATCH_QUESTIONS)
         q_type = request.form.get('question_type', question.question_type or 'mcq_single')
+        if q_type == 'short_text':
+            error = answer_matching.validate((request.form.get('correct_answer_text') or '').strip())
+            if error:
+                flash(f'Acceptable answers: {error}.', 'error')
+                return redirect(url_for('edit_question', question_id=question.id))
+        question.question_text = request.form['question_text']
         question.question_type = q_type
         question.points = float(request.form.get('points', question.points or 1) or 1)
         question.partial_credit = request.form.get('partial_credit', '1') == '1'
@@ -571,28 +1071,22 @@ def edit_question(question_id):
             question.option_b = request.form.get('option_b', '')
             question.option_c = request.form.get('option_c', '')
             question.option_d = request.form.get('option_d', '')
+        bump_paper_version(exams_using_question(question.id))
+        db.session.flush()
+        similar = flag_similar_questions(question)
         db.session.commit()
         flash('Question updated.', 'success')
+        flash_similar_questions(question, similar)
         return redirect(url_for('admin_questions', domain=question.domain))
     return render_template('edit_question.html', question=question)
 
 @app.route('/admin/question/<int:question_id>/delete', methods=['POST'])
+@admin_required(domain_from=question_domain, denied_message='Not allowed to delete this question.', denied_redirect=admin_questions_url)
 def delete_question(question_id):
-    if not session.get('admin_user'):
-        return redirect(url_for('admin_login'))
-    admins = load_admins()
-    admin_info = next((a for a in admins if a.get('username') == session.get('admin_user')), None)
     question = Question.query.get_or_404(question_id)
-    allowed = admin_info.get('domain', 'all') if admin_info else 'all'
-    if isinstance(allowed, str):
-        if allowed != 'all' and question.domain != allowed:
-            flash('Not allowed to delete this question.', 'error')
-            return redirect(url_for('admin_questions', domain=question.domain))
-    else:
-        if allowed and question.domain not in allowed:
-            flash('Not allowed to delete this question.', 'error')
-            return redirect(url_for('admin_questions', domain=question.domain))
     domain = question.domain
+    bump_paper_version(exams_using_question(question.id))
+    QuestionStat.query.filter_by(question_id=question.id).delete()
     db.session.delete(question)
     db.session.commit()
     flash('Question deleted.', 'success')
@@ -601,16 +1095,89 @@ def delete_question(question_id):
 # Path for admin JSON file
 ADMIN_JSON_PATH = os.path.join(os.path.dirname(__file__), 'admins.json')
 
+ALL_DOMAINS = ['web_dev', 'ml', 'data_science']
+
+def resolve_allowed_domains(admin_domains):
+    """Turn an admin's 'domain' field ('all', a single domain or a list) into the domains they may manage."""
+    if isinstance(admin_domains, str):
+        return list(ALL_DOMAINS) if admin_domains == 'all' else [admin_domains]
+    return list(admin_domains) if admin_domains else list(ALL_DOMAINS)
+
+class AdminRegistry:
+    """In-process cache of admins.json, indexed by username and email.
+
+    The file is re-read only when its mtime/size changes or after save_admins(),
+    so admin routes don't pay file I/O and JSON parsing on every request.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._admins = []
+        self._by_username = {}
+        self._by_email = {}
+        self._allowed_domains = {}
+
+    def _file_stamp(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _refresh(self):
+        stamp = self._file_stamp()
+        if stamp is not None and stamp == self._stamp:
+            return
+        with self._lock:
+            if stamp is None:
+                with open(self.path, 'w') as f:
+                    json.dump([], f)
+                stamp = self._file_stamp()
+            if stamp == self._stamp:
+                return
+            with open(self.path, 'r') as f:
+                admins = json.load(f)
+            self._by_username = {a.get('username'): a for a in admins}
+            self._by_email = {a.get('email'): a for a in admins if a.get('email')}
+            self._allowed_domains = {
+                a.get('username'): tuple(resolve_allowed_domains(a.get('domain', [])))
+                for a in admins
+            }
+            self._admins = admins
+            self._stamp = stamp
+
+    def invalidate(self):
+        with self._lock:
+            self._stamp = None
+
+    def all(self):
+        self._refresh()
+        # Callers (manage_admins) mutate the list before saving, so hand out a copy
+        return copy.deepcopy(self._admins)
+
+    def get(self, username):
+        self._refresh()
+        return self._by_username.get(username)
+
+    def get_by_email(self, email):
+        self._refresh()
+        return self._by_email.get(email)
+
+    def allowed_domains(self, username):
+        self._refresh()
+        return list(self._allowed_domains.get(username, ()))
+
+admin_registry = AdminRegistry(ADMIN_JSON_PATH)
+
 def load_admins():
-    if not os.path.exists(ADMIN_JSON_PATH):
-        with open(ADMIN_JSON_PATH, 'w') as f:
-            json.dump([], f)
-    with open(ADMIN_JSON_PATH, 'r') as f:
-        return json.load(f)
+    return admin_registry.all()
 
 def save_admins(admins):
     with open(ADMIN_JSON_PATH, 'w') as f:
         json.dump(admins, f, indent=2)
+    admin_registry.invalidate()
 
 # Initialize database and create sample student user
 
@@ -652,6 +1219,157 @@ def ensure_column(table_name: str, column_name: str, col_def_sql: str):
         db.session.rollback()
         print(f"Column migration skipped for {table_name}.{column_name}: {e}")
 
+def ensure_index(index_name: str, table_name: str, columns_sql: str):
+    """Create an index on an SQLite table if it doesn't already exist."""
+    try:
+        db.session.execute(text(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name} ({columns_sql})"))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Index migration skipped for {table_name}.{index_name}: {e}")
+
+def drop_index(index_name: str):
+    """Drop an SQLite index if it exists (superseded indexes only cost writes)."""
+    try:
+        db.session.execute(text(f"DROP INDEX IF EXISTS {index_name}"))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Index migration skipped for {index_name}: {e}")
+
+POOL_KEY_SQL = {
+    'domain': "{row}.domain",
+    'question_type': "coalesce({row}.question_type, 'mcq_single')",
+    'points': "coalesce({row}.points, 1.0)",
+}
+
+def _pool_match(row, table='question_pool'):
+    return ' AND '.join(f"{table}.{column} = {expr.format(row=row)}" for column, expr in POOL_KEY_SQL.items())
+
+def _pool_add_sql(row):
+    values = ', '.join(expr.format(row=row) for expr in POOL_KEY_SQL.values())
+    return f"""
+        INSERT INTO question_pool (domain, question_type, points, size) VALUES ({values}, 1)
+            ON CONFLICT (domain, question_type, points) DO UPDATE SET size = size + 1;
+        INSERT INTO question_pool_slot (domain, question_type, points, slot, question_id)
+            SELECT domain, question_type, points, size - 1, {row}.id FROM question_pool WHERE {_pool_match(row)};"""
+
+def _pool_remove_sql(row):
+    # Park the row at -(slot + 1), move the stratum's last slot into the hole, then drop it
+    slot_match = _pool_match(row, 'question_pool_slot')
+    return f"""
+        UPDATE question_pool_slot SET slot = -slot - 1 WHERE question_id = {row}.id;
+        UPDATE question_pool_slot
+            SET slot = -(SELECT slot FROM question_pool_slot WHERE question_id = {row}.id) - 1
+            WHERE {slot_match}
+              AND slot = (SELECT size - 1 FROM question_pool WHERE {_pool_match(row)});
+        DELETE FROM question_pool_slot WHERE question_id = {row}.id;
+        UPDATE question_pool SET size = size - 1 WHERE {_pool_match(row)};"""
+
+POOL_TRIGGERS = {
+    'trg_question_pool_insert': f"AFTER INSERT ON question BEGIN {_pool_add_sql('NEW')} END",
+    'trg_question_pool_delete': f"AFTER DELETE ON question BEGIN {_pool_remove_sql('OLD')} END",
+    'trg_question_pool_update': (
+        "AFTER UPDATE OF domain, question_type, points ON question "
+        "WHEN OLD.domain IS NOT NEW.domain "
+        "OR coalesce(OLD.question_type, 'mcq_single') IS NOT coalesce(NEW.question_type, 'mcq_single') "
+        "OR coalesce(OLD.points, 1.0) IS NOT coalesce(NEW.points, 1.0) "
+        f"BEGIN {_pool_remove_sql('OLD')} {_pool_add_sql('NEW')} END"),
+}
+
+def rebuild_question_pool():
+    """Renumber every stratum from the question table (backfill / repair)."""
+    keys = ', '.join(f"{expr.format(row='question')} AS {column}" for column, expr in POOL_KEY_SQL.items())
+    db.session.execute(text("DELETE FROM question_pool_slot"))
+    db.session.execute(text("DELETE FROM question_pool"))
+    db.session.execute(text(f"""
+        INSERT INTO question_pool_slot (domain, question_type, points, slot, question_id)
+        SELECT domain, question_type, points,
+               row_number() OVER (PARTITION BY domain, question_type, points ORDER BY id) - 1, id
+        FROM (SELECT id, {keys} FROM question)"""))
+    db.session.execute(text("""
+        INSERT INTO question_pool (domain, question_type, points, size)
+        SELECT domain, question_type, points, count(*) FROM question_pool_slot
+        GROUP BY domain, question_type, points"""))
+    db.session.commit()
+
+def ensure_question_pool():
+    """Install the pool triggers and renumber the pool if it has drifted from the question table."""
+    try:
+        for name, body in POOL_TRIGGERS.items():
+            db.session.execute(text(f"CREATE TRIGGER IF NOT EXISTS {name} {body}"))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Question pool triggers skipped: {e}")
+        return
+    questions = db.session.query(func.count(Question.id)).scalar()
+    sized = db.session.query(func.coalesce(func.sum(QuestionPool.size), 0)).scalar()
+    if questions != sized or questions != db.session.query(func.count(QuestionPoolSlot.question_id)).scalar():
+        rebuild_question_pool()
+
+QUESTION_FTS_TRIGGERS = {
+    'trg_question_fts_insert': "AFTER INSERT ON question BEGIN "
+                               "INSERT INTO question_fts (rowid, question_text) VALUES (NEW.id, NEW.question_text); END",
+    'trg_question_fts_delete': "AFTER DELETE ON question BEGIN "
+                               "INSERT INTO question_fts (question_fts, rowid, question_text) VALUES ('delete', OLD.id, OLD.question_text); END",
+    'trg_question_fts_update': "AFTER UPDATE OF question_text ON question BEGIN "
+                               "INSERT INTO question_fts (question_fts, rowid, question_text) VALUES ('delete', OLD.id, OLD.question_text); "
+                               "INSERT INTO question_fts (rowid, question_text) VALUES (NEW.id, NEW.question_text); END",
+}
+question_fts_enabled = False
+
+def ensure_question_search():
+    """Create the FTS5 index over question_text (kept in sync by triggers); falls back to LIKE without FTS5."""
+    global question_fts_enabled
+    try:
+        exists = db.session.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'question_fts'")).first()
+        if not exists:
+            db.session.execute(text("CREATE VIRTUAL TABLE question_fts USING fts5("
+                                    "question_text, content='question', content_rowid='id')"))
+        for name, body in QUESTION_FTS_TRIGGERS.items():
+            db.session.execute(text(f"CREATE TRIGGER IF NOT EXISTS {name} {body}"))
+        if not exists:
+            db.session.execute(text("INSERT INTO question_fts (question_fts) VALUES ('rebuild')"))
+        db.session.commit()
+        question_fts_enabled = True
+    except Exception as e:
+        db.session.rollback()
+        print(f"Question full-text search unavailable, using LIKE: {e}")
+
+# Signatures are computed in Python, so triggers can only drop stale ones and queue the question
+# in pending_question_signature for update_similarity_index (add/edit sign their question straight away).
+SIMILARITY_TRIGGERS = {
+    'trg_question_similarity_insert': "AFTER INSERT ON question BEGIN "
+                                      "INSERT OR IGNORE INTO pending_question_signature (question_id) VALUES (NEW.id); END",
+    'trg_question_similarity_delete': "AFTER DELETE ON question BEGIN "
+                                      "DELETE FROM question_signature WHERE question_id = OLD.id; "
+                                      "DELETE FROM question_lsh_bucket WHERE question_id = OLD.id; "
+                                      "DELETE FROM pending_question_signature WHERE question_id = OLD.id; END",
+    'trg_question_similarity_update': "AFTER UPDATE OF domain, question_text, option_a, option_b, option_c, option_d ON question BEGIN "
+                                      "DELETE FROM question_signature WHERE question_id = OLD.id; "
+                                      "DELETE FROM question_lsh_bucket WHERE question_id = OLD.id; "
+                                      "INSERT OR IGNORE INTO pending_question_signature (question_id) VALUES (NEW.id); END",
+}
+
+def ensure_question_similarity():
+    try:
+        queued = db.session.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'trg_question_similarity_insert'")).first()
+        if not queued:
+            # Earlier versions found unsigned questions by scanning the bank: replace their
+            # triggers and queue every question without a signature once
+            for name in SIMILARITY_TRIGGERS:
+                db.session.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+        for name, body in SIMILARITY_TRIGGERS.items():
+            db.session.execute(text(f"CREATE TRIGGER IF NOT EXISTS {name} {body}"))
+        if not queued:
+            db.session.execute(text("INSERT OR IGNORE INTO pending_question_signature (question_id) "
+                                    "SELECT id FROM question WHERE id NOT IN (SELECT question_id FROM question_signature)"))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Question similarity triggers skipped: {e}")
+
 with app.app_context():
     # Ensure tables exist first, then apply lightweight migrations
     db.create_all()
@@ -661,8 +1379,15 @@ with app.app_context():
     ensure_column('question', 'points', 'points FLOAT DEFAULT 1.0')
     ensure_column('question', 'partial_credit', 'partial_credit BOOLEAN DEFAULT 1')
     ensure_column('question', 'correct_answer', 'correct_answer VARCHAR(10)')
+    ensure_column('exam', 'paper_version', 'paper_version INTEGER DEFAULT 0')
+    ensure_column('exam', 'shuffle', 'shuffle BOOLEAN DEFAULT 0')
+    ensure_column('paper_snapshot', 'shuffle', 'shuffle BOOLEAN DEFAULT 0')
+    ensure_column('paper_snapshot', 'sampled', 'sampled BOOLEAN DEFAULT 0')
     ensure_column('exam_session', 'score', 'score FLOAT DEFAULT 0.0')
     ensure_column('exam_session', 'exam_id', 'exam_id INTEGER')
+    ensure_column('exam_session', 'item_stats_applied', 'item_stats_applied BOOLEAN DEFAULT 0')
+    ensure_column('exam_session', 'paper_version', 'paper_version INTEGER')
+    ensure_column('exam_session', 'submitted_at', 'submitted_at DATETIME')
     ensure_column('exam_response', 'user_answer', 'user_answer TEXT')
     ensure_column('exam_response', 'awarded_points', 'awarded_points FLOAT DEFAULT 0.0')
     # Create retake permission table if not exists
@@ -670,141 +1395,190 @@ with app.app_context():
         db.create_all()  # safe call; ensures new tables like ExamRetakePermission
     except Exception:
         pass
+    # Indexes for the hot lookup paths (student pages, results, grading, paper loading)
+    ensure_index('ix_exam_session_user_completed', 'exam_session', 'user_id, is_completed')
+    ensure_index('ix_exam_session_exam_completed', 'exam_session', 'exam_id, is_completed')
+    ensure_index('ix_exam_session_domain_completed', 'exam_session', 'domain, is_completed')
+    ensure_index('ix_exam_response_session', 'exam_response', 'exam_session_id')
+    ensure_index('ix_exam_question_exam_order', 'exam_question', 'exam_id, display_order')
+    ensure_index('ix_exam_retake_user_exam', 'exam_retake_permission', 'user_id, exam_id')
+    drop_index('ix_question_domain_created')  # nothing orders questions by created_at within a domain
+    ensure_index('ix_exam_session_item_stats', 'exam_session', 'is_completed, item_stats_applied')
+    # Keyset pages walk a domain in id order; (domain) keeps the rowid right after the domain
+    ensure_index('ix_question_domain', 'question', 'domain')
+    ensure_index('ix_question_domain_type_points', 'question', 'domain, question_type, points')
+    ensure_question_pool()
+    ensure_question_search()
+    ensure_question_similarity()
+    # Backfill materialized result aggregates for exams that predate them
+    missing = (db.session.query(Exam.id)
+               .outerjoin(ExamAggregate, ExamAggregate.exam_id == Exam.id)
+               .filter(ExamAggregate.exam_id.is_(None)).all())
+    for (missing_exam_id,) in missing:
+        rebuild_exam_aggregates(missing_exam_id)
+    db.session.commit()
     # Create default records after schema is up-to-date
     create_tables()
 
 @app.route('/admin/exams/<domain>')
+@admin_required(domain_from=url_domain, denied_message='You are not allowed to manage exams for this domain.')
 def admin_exams(domain):
-    if not session.get('admin_user'):
-        flash('Please log in as admin.', 'error')
-        return redirect(url_for('admin_login'))
-    admins = load_admins()
-    admin_info = next((a for a in admins if a.get('username') == session.get('admin_user')), None)
-    if not admin_info:
-        session.pop('admin_user', None)
-        session.pop('admin_domains', None)
-        flash('Admin account not found. Please log in again.', 'error')
-        return redirect(url_for('admin_login'))
-    all_domains = ['web_dev', 'ml', 'data_science']
-    admin_domains = admin_info.get('domain', [])
-    if isinstance(admin_domains, str):
-        if admin_domains == 'all':
-            allowed_domains = all_domains
-        else:
-            allowed_domains = [admin_domains]
-    else:
-        allowed_domains = admin_domains if admin_domains else all_domains
-    if domain not in allowed_domains:
-        flash('You are not allowed to manage exams for this domain.', 'error')
-        return redirect(url_for('admin_dashboard_json'))
     exams = Exam.query.filter_by(domain=domain).order_by(Exam.created_at.desc()).all()
     return render_template('admin_exams.html', domain=domain, exams=exams)
 
 @app.route('/admin/exams/create', methods=['GET', 'POST'])
+@admin_required()
 def create_exam():
-    if not session.get('admin_user'):
-        flash('Please log in as admin.', 'error')
-        return redirect(url_for('admin_login'))
-    admins = load_admins()
-    admin_info = next((a for a in admins if a.get('username') == session.get('admin_user')), None)
-    if not admin_info:
-        session.pop('admin_user', None)
-        session.pop('admin_domains', None)
-        flash('Admin account not found. Please log in again.', 'error')
-        return redirect(url_for('admin_login'))
-    all_domains = ['web_dev', 'ml', 'data_science']
-    admin_domains = admin_info.get('domain', [])
-    if isinstance(admin_domains, str):
-        if admin_domains == 'all':
-            allowed_domains = all_domains
-        else:
-            allowed_domains = [admin_domains]
-    else:
-        allowed_domains = admin_domains if admin_domains else all_domains
+    scope = get_admin_scope()
     if request.method == 'POST':
         name = (request.form.get('name') or '').strip()
         domain = request.form.get('domain')
         if not name:
             flash('Exam name is required.', 'error')
             return redirect(url_for('create_exam'))
-        if domain not in allowed_domains:
+        if not scope.allows(domain):
             flash('You are not allowed to create exam for this domain.', 'error')
             return redirect(url_for('create_exam'))
-        new_exam = Exam(name=name, domain=domain, is_visible=False)
+        new_exam = Exam(name=name, domain=domain, is_visible=False, shuffle=bool(request.form.get('shuffle')))
         db.session.add(new_exam)
+        db.session.flush()
+        db.session.add(ExamAggregate(exam_id=new_exam.id))
         db.session.commit()
         flash('Exam created successfully!', 'success')
         return redirect(url_for('admin_exams', domain=domain))
-    return render_template('create_exam.html', domains=allowed_domains)
+    return render_template('create_exam.html', domains=scope.domains)
 
 @app.route('/admin/exams/toggle/<int:exam_id>', methods=['POST'])
+@admin_required(domain_from=exam_domain, denied_message='Not allowed to update this exam.', denied_redirect=admin_exams_url)
 def toggle_exam_visibility(exam_id):
-    if not session.get('admin_user'):
-        flash('Please log in as admin.', 'error')
-        return redirect(url_for('admin_login'))
-    admins = load_admins()
-    admin_info = next((a for a in admins if a.get('username') == session.get('admin_user')), None)
     exam = Exam.query.get_or_404(exam_id)
-    # domain authorization
-    allowed = admin_info.get('domain', 'all') if admin_info else 'all'
-    if isinstance(allowed, str):
-        if allowed != 'all' and exam.domain != allowed:
-            flash('Not allowed to update this exam.', 'error')
-            return redirect(url_for('admin_exams', domain=exam.domain))
-    else:
-        if allowed and exam.domain not in allowed:
-            flash('Not allowed to update this exam.', 'error')
-            return redirect(url_for('admin_exams', domain=exam.domain))
     exam.is_visible = not exam.is_visible
     db.session.commit()
     flash(f"Exam visibility set to {'ON' if exam.is_visible else 'OFF'}.", 'success')
     return redirect(url_for('admin_exams', domain=exam.domain))
 
+@app.route('/admin/exams/shuffle/<int:exam_id>', methods=['POST'])
+@admin_required(domain_from=exam_domain, denied_message='Not allowed to update this exam.', denied_redirect=admin_exams_url)
+def toggle_exam_shuffle(exam_id):
+    exam = Exam.query.get_or_404(exam_id)
+    exam.shuffle = not exam.shuffle
+    # New version so sessions already in progress keep the order they started with
+    bump_paper_version([exam.id])
+    db.session.commit()
+    flash(f"Question order set to {'shuffled per student' if exam.shuffle else 'fixed'}.", 'success')
+    return redirect(url_for('admin_exams', domain=exam.domain))
+
+def save_question_paper(exam, selected_ids):
+    """Make the exam's paper exactly `selected_ids` (in that order) with one validation query
+    and a diff applied in a single transaction, so students never see a half-saved paper.
+    Ids that aren't questions of the exam's domain are skipped. Returns whether anything changed.
+    """
+    wanted = []
+    for qid in selected_ids:
+        try:
+            wanted.append(int(qid))
+        except (TypeError, ValueError):
+            continue
+    wanted = list(dict.fromkeys(wanted))
+    valid = {qid for (qid,) in db.session.query(Question.id)
+             .filter(Question.id.in_(wanted), Question.domain == exam.domain).all()} if wanted else set()
+    order = {qid: position for position, qid in enumerate((qid for qid in wanted if qid in valid), 1)}
+
+    current = {}
+    stale = []
+    for row_id, qid, display_order in (db.session.query(ExamQuestion.id, ExamQuestion.question_id, ExamQuestion.display_order)
+                                       .filter_by(exam_id=exam.id).order_by(ExamQuestion.id).all()):
+        if qid in order and qid not in current:
+            current[qid] = (row_id, display_order)
+        else:
+            stale.append(row_id)  # dropped from the paper, or a duplicate row
+    reorder = [{'id': row_id, 'display_order': order[qid]}
+               for qid, (row_id, display_order) in current.items() if display_order != order[qid]]
+    inserts = [{'exam_id': exam.id, 'question_id': qid, 'display_order': position}
+               for qid, position in order.items() if qid not in current]
+    if not (stale or reorder or inserts):
+        return False
+    if stale:
+        ExamQuestion.query.filter(ExamQuestion.id.in_(stale)).delete(synchronize_session=False)
+    if reorder:
+        db.session.execute(update(ExamQuestion), reorder)
+    if inserts:
+        db.session.execute(ExamQuestion.__table__.insert(), inserts)
+    bump_paper_version([exam.id])
+    db.session.commit()
+    return True
+
 @app.route('/admin/exams/<int:exam_id>/set_questions', methods=['GET', 'POST'])
+@admin_required()
 def set_question_paper(exam_id):
-    if not session.get('admin_user'):
-        flash('Please log in as admin.', 'error')
-        return redirect(url_for('admin_login'))
-    admins = load_admins()
-    admin_info = next((a for a in admins if a.get('username') == session.get('admin_user')), None)
     exam = Exam.query.get(exam_id)
     if not exam:
         flash('Please create an exam first before setting a question paper.', 'error')
         return redirect(url_for('create_exam'))
-    # domain authorization
-    allowed = admin_info.get('domain', 'all') if admin_info else 'all'
-    if isinstance(allowed, str):
-        if allowed != 'all' and exam.domain != allowed:
-            flash('Not allowed to modify this exam.', 'error')
-            return redirect(url_for('admin_exams', domain=exam.domain))
-    else:
-        if allowed and exam.domain not in allowed:
-            flash('Not allowed to modify this exam.', 'error')
-            return redirect(url_for('admin_exams', domain=exam.domain))
+    if not get_admin_scope().allows(exam.domain):
+        flash('Not allowed to modify this exam.', 'error')
+        return redirect(url_for('admin_exams', domain=exam.domain))
     if request.method == 'POST':
         selected_ids = request.form.getlist('question_ids')
-        # wipe existing selection
-        ExamQuestion.query.filter_by(exam_id=exam.id).delete()
-        db.session.commit()
-        order_counter = 1
-        for qid in selected_ids:
-            try:
-                qid_int = int(qid)
-            except ValueError:
-                continue
-            exists = Question.query.get(qid_int)
-            if not exists or exists.domain != exam.domain:
-                continue
-            eq = ExamQuestion(exam_id=exam.id, question_id=qid_int, display_order=order_counter)
-            db.session.add(eq)
-            order_counter += 1
-        db.session.commit()
-        flash('Question paper updated.', 'success')
+        page_ids = request.form.getlist('page_ids')
+        if page_ids:
+            # Paged form: only the questions shown on that page can have changed
+            shown = set(page_ids)
+            current = [str(qid) for (qid,) in db.session.query(ExamQuestion.question_id)
+                       .filter_by(exam_id=exam.id).order_by(ExamQuestion.display_order, ExamQuestion.id).all()]
+            selected_ids = [qid for qid in current if qid not in shown or qid in selected_ids] + selected_ids
+        if save_question_paper(exam, selected_ids):
+            flash('Question paper updated.', 'success')
+        else:
+            flash('Question paper unchanged.', 'info')
+        if page_ids:
+            return_args = {key: request.form[key] for key in ('q', 'type', 'points', 'after', 'before', 'on_paper')
+                           if request.form.get(key)}
+            return redirect(url_for('set_question_paper', exam_id=exam.id, **return_args))
         return redirect(url_for('admin_exams', domain=exam.domain))
     # GET
-    all_questions = Question.query.filter_by(domain=exam.domain).order_by(Question.created_at.desc()).all()
-    selected_map = {eq.question_id for eq in ExamQuestion.query.filter_by(exam_id=exam.id).all()}
-    return render_template('set_question_paper.html', exam=exam, questions=all_questions, selected_map=selected_map)
+    on_paper = request.args.get('on_paper') == '1'
+    bank = Question.query.filter_by(domain=exam.domain)
+    if on_paper:
+        bank = bank.filter(Question.id.in_(db.session.query(ExamQuestion.question_id).filter_by(exam_id=exam.id)))
+    page = question_bank_page(bank, request.args)
+    page_ids = [q.id for q in page.items]
+    selected_map = {qid for (qid,) in db.session.query(ExamQuestion.question_id)
+                    .filter(ExamQuestion.exam_id == exam.id, ExamQuestion.question_id.in_(page_ids)).all()} if page_ids else set()
+    paper_size = ExamQuestion.query.filter_by(exam_id=exam.id).count()
+    blueprint_rules = ExamBlueprintRule.query.filter_by(exam_id=exam.id).order_by(ExamBlueprintRule.position, ExamBlueprintRule.id).all()
+    pool = (QuestionPool.query.filter(QuestionPool.domain == exam.domain, QuestionPool.size > 0)
+            .order_by(QuestionPool.question_type, QuestionPool.points).all())
+    return render_template('set_question_paper.html', exam=exam, questions=page.items, page=page, selected_map=selected_map,
+                           paper_size=paper_size, on_paper=on_paper, blueprint_rules=blueprint_rules, pool=pool,
+                           question_types=BLUEPRINT_QUESTION_TYPES)
+
+@app.route('/admin/exams/<int:exam_id>/blueprint', methods=['POST'])
+@admin_required(domain_from=exam_domain, denied_message='Not allowed to modify this exam.', denied_redirect=admin_exams_url)
+def save_exam_blueprint(exam_id):
+    exam = Exam.query.get_or_404(exam_id)
+    rules = []
+    for count, qtype, points in zip(request.form.getlist('rule_count'), request.form.getlist('rule_type'),
+                                    request.form.getlist('rule_points')):
+        try:
+            count = int(count or 0)
+            points = float(points) if points.strip() else None
+        except ValueError:
+            flash('Blueprint counts and points must be numbers.', 'error')
+            return redirect(url_for('set_question_paper', exam_id=exam.id))
+        if count <= 0:
+            continue
+        rules.append(ExamBlueprintRule(exam_id=exam.id, question_type=qtype if qtype in BLUEPRINT_QUESTION_TYPES else None,
+                                       points=points, count=count, position=len(rules)))
+    ExamBlueprintRule.query.filter_by(exam_id=exam.id).delete()
+    db.session.add_all(rules)
+    bump_paper_version([exam.id])
+    db.session.commit()
+    if rules:
+        flash(f'Blueprint saved: each attempt draws {sum(r.count for r in rules)} questions.', 'success')
+    else:
+        flash('Blueprint cleared; the hand-picked paper is used.', 'success')
+    return redirect(url_for('set_question_paper', exam_id=exam.id))
 
 @app.route('/student/dashboard')
 @login_required
@@ -814,7 +1588,8 @@ def student_dashboard():
         return redirect(url_for('index'))
     active_session = ExamSession.query.filter_by(
         user_id=current_user.id,
-        is_completed=False
+        is_completed=False,
+        submitted_at=None
     ).first()
     if active_session:
         return redirect(url_for('take_exam', session_id=active_session.id))
@@ -831,7 +1606,8 @@ def confirm_start_exam(domain):
     # If any active session exists, continue it
     active_session = ExamSession.query.filter_by(
         user_id=current_user.id,
-        is_completed=False
+        is_completed=False,
+        submitted_at=None
     ).first()
     if active_session:
         return redirect(url_for('take_exam', session_id=active_session.id))
@@ -882,7 +1658,8 @@ def start_exam(domain):
         return redirect(url_for('index'))
     active_session = ExamSession.query.filter_by(
         user_id=current_user.id,
-        is_completed=False
+        is_completed=False,
+        submitted_at=None
     ).first()
     if active_session:
         flash('You already have an active exam session', 'error')
@@ -899,7 +1676,8 @@ def start_exam_by_exam(exam_id):
         return redirect(url_for('index'))
     active_session = ExamSession.query.filter_by(
         user_id=current_user.id,
-        is_completed=False
+        is_completed=False,
+        submitted_at=None
     ).first()
     if active_session:
         flash('You already have an active exam session', 'error')
@@ -920,10 +1698,14 @@ def start_exam_by_exam(exam_id):
             else:
                 flash('You have already attempted this exam.', 'error')
                 return redirect(url_for('student_dashboard'))
+        elif prior_attempt.submitted_at:
+            flash('Your attempt at this exam is still being graded.', 'info')
+            return redirect(url_for('exam_results', session_id=prior_attempt.id))
         else:
             # Resume existing unfinished attempt
             flash('Resuming your active exam session.', 'info')
             return redirect(url_for('take_exam', session_id=prior_attempt.id))
+    snapshot = freeze_paper(exam)
     start_time = datetime.utcnow()
     end_time = start_time + timedelta(minutes=30)
     exam_session = ExamSession(
@@ -931,9 +1713,16 @@ def start_exam_by_exam(exam_id):
         domain=exam.domain,
         exam_id=exam.id,
         start_time=start_time,
-        end_time=end_time
+        end_time=end_time,
+        paper_version=snapshot.version,
+        total_questions=snapshot.question_count
     )
     db.session.add(exam_session)
+    if snapshot.sampled:
+        paper = load_paper_questions(sample_blueprint_questions(exam))
+        db.session.flush()
+        db.session.add(SessionPaper(exam_session_id=exam_session.id, payload=json.dumps(paper)))
+        exam_session.total_questions = len(paper)
     db.session.commit()
     return redirect(url_for('take_exam', session_id=exam_session.id))
 
@@ -950,27 +1739,27 @@ def take_exam(session_id):
     if exam_session.is_completed:
         flash('This exam has already been completed', 'info')
         return redirect(url_for('student_dashboard'))
+    if exam_session.submitted_at:
+        return redirect(url_for('exam_results', session_id=session_id))
     if datetime.utcnow() > exam_session.end_time:
         submit_exam(session_id)
         flash('Time expired! Exam submitted automatically.', 'info')
         return redirect(url_for('exam_results', session_id=session_id))
     if exam_session.exam_id:
-        selected = (ExamQuestion.query
-                    .filter_by(exam_id=exam_session.exam_id)
-                    .order_by(ExamQuestion.display_order.asc(), ExamQuestion.id.asc())
-                    .all())
-        question_ids = [s.question_id for s in selected]
-        if question_ids:
-            qs = Question.query.filter(Question.id.in_(question_ids)).all()
-            by_id = {q.id: q for q in qs}
-            questions = [by_id[qid] for qid in question_ids if qid in by_id]
-        else:
-            questions = []
+        paper = session_paper(exam_session)
+        questions = paper.questions
+        questions_html = Markup('').join(render_question_card(paper.exam_id, paper.version, question, letters)
+                                         for question, letters in session_layout(exam_session.id, paper))
     else:
         questions = Question.query.filter_by(domain=exam_session.domain).all()
-    exam_session.total_questions = len(questions)
-    db.session.commit()
-    return render_template('take_exam.html', exam_session=exam_session, questions=questions)
+        if exam_session.total_questions != len(questions):
+            exam_session.total_questions = len(questions)
+            db.session.commit()
+        questions_html = Markup('').join(Markup(render_template('exam_question_card.html', question=question, letters=OPTION_ORDER))
+                                         for question in questions)
+    drafts = load_draft_answers(session_id)
+    return render_template('take_exam.html', exam_session=exam_session, questions_html=questions_html,
+                           question_count=len(questions), question_ids=[q.id for q in questions], drafts=drafts)
 
 @app.route('/submit_exam/<int:session_id>', methods=['POST'])
 @login_required
@@ -986,92 +1775,609 @@ def submit_exam_route(session_id):
     flash('Exam submitted successfully!', 'success')
     return redirect(url_for('exam_results', session_id=session_id))
 
-def submit_exam(session_id):
-    exam_session = ExamSession.query.get(session_id)
-    if not exam_session or exam_session.is_completed:
+class CompiledQuestion:
+    """Grading data for one question, normalized once so grading is just set/lookups."""
+
+    __slots__ = ('id', 'question_type', 'points', 'partial_credit', 'correct_set', 'correct_choice', 'matcher')
+
+    def __init__(self, row):
+        self.id = row.id
+        self.question_type = row.question_type or 'mcq_single'
+        self.points = row.points if row.points is not None else 1.0
+        self.partial_credit = bool(row.partial_credit)
+        self.correct_set = frozenset((row.correct_answer or '').split(','))
+        self.correct_choice = (row.correct_answer or '').split(',')[0]
+        # Compiled matchers are shared by every key holding the same answer text
+        self.matcher = answer_matching.compile_matcher(row.correct_answer_text or '') if self.question_type == 'short_text' else None
+
+class AnswerKey:
+    """Ordered question ids and compiled grading data for one version of an exam's paper."""
+
+    def __init__(self, exam_id, version, question_ids, questions_by_id):
+        self.exam_id = exam_id
+        self.version = version
+        self.question_ids = tuple(question_ids)
+        self.questions = questions_by_id
+
+    def __contains__(self, question_id):
+        return question_id in self.questions
+
+GRADING_COLUMNS = (Question.id, Question.question_type, Question.correct_answer,
+                   Question.correct_answer_text, Question.points, Question.partial_credit)
+
+def compile_answer_key(exam_id, version):
+    question_ids = [qid for (qid,) in (db.session.query(ExamQuestion.question_id)
+                                       .filter_by(exam_id=exam_id)
+                                       .order_by(ExamQuestion.display_order.asc(), ExamQuestion.id.asc())
+                                       .all())]
+    rows = db.session.query(*GRADING_COLUMNS).filter(Question.id.in_(question_ids)).all() if question_ids else []
+    questions = {row.id: CompiledQuestion(row) for row in rows}
+    # Drop ids whose question has since been deleted
+    return AnswerKey(exam_id, version, [qid for qid in question_ids if qid in questions], questions)
+
+def compile_domain_answer_key(domain):
+    """Answer key for legacy domain-wide sessions (no exam); not cached."""
+    rows = db.session.query(*GRADING_COLUMNS).filter_by(domain=domain).all()
+    return AnswerKey(None, None, [row.id for row in rows], {row.id: CompiledQuestion(row) for row in rows})
+
+class AnswerKeyCache:
+    """Process-local LRU of compiled answer keys, keyed by exam id and checked against Exam.paper_version.
+
+    The version check keeps workers that did not see an edit from grading against a stale key.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._keys = OrderedDict()
+
+    def get(self, exam_id):
+        version = db.session.query(Exam.paper_version).filter_by(id=exam_id).scalar() or 0
+        with self._lock:
+            key = self._keys.get(exam_id)
+            if key is not None and key.version == version:
+                self._keys.move_to_end(exam_id)
+                return key
+        key = compile_answer_key(exam_id, version)
+        with self._lock:
+            self._keys[exam_id] = key
+            self._keys.move_to_end(exam_id)
+            while len(self._keys) > self.max_entries:
+                self._keys.popitem(last=False)
+        return key
+
+    def invalidate(self, exam_id):
+        with self._lock:
+            self._keys.pop(exam_id, None)
+
+answer_key_cache = AnswerKeyCache(max_entries=int(os.environ.get('EXAM_ANSWER_KEY_CACHE_SIZE', '256')))
+
+def answer_key_for_session(exam_session):
+    """Current answer key for the questions the session was actually shown.
+
+    If the paper changed after the session started, or the session drew its own questions
+    from a blueprint, that frozen question set is graded against the questions' current answers.
+    """
+    if not exam_session.exam_id:
+        return compile_domain_answer_key(exam_session.domain)
+    key = answer_key_cache.get(exam_session.exam_id)
+    if exam_session.paper_version is None:
+        return key
+    paper = session_paper(exam_session)
+    if not paper.sampled and paper.version == key.version:
+        return key
+    question_ids = [q.id for q in paper.questions]
+    rows = db.session.query(*GRADING_COLUMNS).filter(Question.id.in_(question_ids)).all() if question_ids else []
+    questions = {row.id: CompiledQuestion(row) for row in rows}
+    return AnswerKey(exam_session.exam_id, exam_session.paper_version,
+                     [qid for qid in question_ids if qid in questions], questions)
+
+SNAPSHOT_FIELDS = ('id', 'question_type', 'question_text', 'option_a', 'option_b', 'option_c', 'option_d', 'points')
+
+class PaperQuestion:
+    """Read-only question as shown to students; carries no answer data."""
+
+    __slots__ = SNAPSHOT_FIELDS
+
+    def __init__(self, data):
+        for field in SNAPSHOT_FIELDS:
+            setattr(self, field, data.get(field))
+
+def load_paper_questions(question_ids):
+    """Serializable question dicts for `question_ids`, in that order (deleted ones dropped)."""
+    rows = db.session.query(*(getattr(Question, field) for field in SNAPSHOT_FIELDS)).filter(Question.id.in_(question_ids)).all() if question_ids else []
+    by_id = {row.id: dict(row._mapping) for row in rows}
+    return [by_id[qid] for qid in question_ids if qid in by_id]
+
+def freeze_paper(exam):
+    """Snapshot for the exam's current paper version, serializing it on first use (caller commits)."""
+    version = exam.paper_version or 0
+    snapshot = db.session.get(PaperSnapshot, (exam.id, version))
+    if snapshot is not None:
+        return snapshot
+    sampled = db.session.query(ExamBlueprintRule.query.filter_by(exam_id=exam.id).exists()).scalar()
+    paper = [] if sampled else load_paper_questions(answer_key_cache.get(exam.id).question_ids)
+    db.session.execute(sqlite_insert(PaperSnapshot.__table__)
+                       .values(exam_id=exam.id, version=version, question_count=len(paper),
+                               payload=json.dumps(paper), shuffle=bool(exam.shuffle), sampled=sampled,
+                               created_at=datetime.utcnow())
+                       .on_conflict_do_nothing())
+    return db.session.get(PaperSnapshot, (exam.id, version))
+
+class Paper:
+    def __init__(self, exam_id, version, shuffle, questions, sampled=False):
+        self.exam_id = exam_id
+        self.version = version
+        self.shuffle = shuffle
+        self.questions = questions
+        self.sampled = sampled
+
+@lru_cache(maxsize=int(os.environ.get('EXAM_PAPER_CACHE_SIZE', '256')))
+def load_paper_snapshot(exam_id, version):
+    """Deserialized paper of an exam version. Snapshots never change, so caching needs no invalidation."""
+    row = (db.session.query(PaperSnapshot.payload, PaperSnapshot.shuffle, PaperSnapshot.sampled)
+           .filter_by(exam_id=exam_id, version=version).first())
+    if row is None:
+        raise LookupError(f'No paper snapshot for exam {exam_id} version {version}')
+    return Paper(exam_id, version, bool(row.shuffle), tuple(PaperQuestion(data) for data in json.loads(row.payload)),
+                 sampled=bool(row.sampled))
+
+def option_order(session_id, question):
+    """Canonical option letters in the order this session sees them."""
+    if question.question_type == 'short_text':
+        return OPTION_ORDER
+    letters = list(OPTION_ORDER)
+    random.Random(f'{session_id}:{question.id}').shuffle(letters)
+    return tuple(letters)
+
+def session_layout(session_id, paper):
+    """[(question, option letters)] for a session; a pure function of the session id, so nothing is stored."""
+    if not paper.shuffle:
+        return [(question, OPTION_ORDER) for question in paper.questions]
+    questions = list(paper.questions)
+    random.Random(session_id).shuffle(questions)
+    return [(question, option_order(session_id, question)) for question in questions]
+
+OPTION_ORDER = ('A', 'B', 'C', 'D')
+
+class FragmentCache:
+    """Process-local LRU of rendered HTML fragments keyed by tuples starting with (exam_id, paper_version)."""
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._fragments = OrderedDict()
+
+    def get_or_render(self, key, render):
+        with self._lock:
+            html = self._fragments.get(key)
+            if html is not None:
+                self._fragments.move_to_end(key)
+                return html
+        # Rendering outside the lock; a concurrent miss just renders the same markup twice
+        html = Markup(render())
+        with self._lock:
+            self._fragments[key] = html
+            self._fragments.move_to_end(key)
+            while len(self._fragments) > self.max_entries:
+                self._fragments.popitem(last=False)
+        return html
+
+    def invalidate(self, exam_id):
+        with self._lock:
+            for key in [key for key in self._fragments if key[0] == exam_id]:
+                del self._fragments[key]
+
+question_fragment_cache = FragmentCache(max_entries=int(os.environ.get('EXAM_FRAGMENT_CACHE_SIZE', '4096')))
+
+def render_question_card(exam_id, version, question, letters):
+    # Cards depend only on the question and its option order, so shuffled sessions share them too
+    return question_fragment_cache.get_or_render(
+        (exam_id, version, question.id, letters),
+        lambda: render_template('exam_question_card.html', question=question, letters=letters))
+
+def session_paper(exam_session):
+    version = exam_session.paper_version
+    if version is None:
+        # Session started before papers were frozen: serve the current version's snapshot
+        exam = db.session.get(Exam, exam_session.exam_id)
+        version = freeze_paper(exam).version
+        db.session.commit()
+    paper = load_paper_snapshot(exam_session.exam_id, version)
+    if not paper.sampled:
+        return paper
+    payload = db.session.query(SessionPaper.payload).filter_by(exam_session_id=exam_session.id).scalar()
+    questions = tuple(PaperQuestion(data) for data in json.loads(payload or '[]'))
+    return Paper(paper.exam_id, version, paper.shuffle, questions, sampled=True)
+
+def bump_paper_version(exam_ids):
+    """Mark the papers of `exam_ids` as changed (caller commits) and drop their cached keys."""
+    exam_ids = list(exam_ids)
+    if not exam_ids:
         return
-    responses_dict = request.form.to_dict(flat=False)  # allow multi-select
-    total_score = 0.0
-    # Build the full set of question ids for this session
-    if exam_session.exam_id:
-        selected = (ExamQuestion.query
-                    .filter_by(exam_id=exam_session.exam_id)
-                    .order_by(ExamQuestion.display_order.asc(), ExamQuestion.id.asc())
-                    .all())
-        question_ids = [s.question_id for s in selected]
-        if question_ids:
-            qs = Question.query.filter(Question.id.in_(question_ids)).all()
-            questions_by_id = {q.id: q for q in qs}
-        else:
-            questions_by_id = {}
-    else:
-        qs = Question.query.filter_by(domain=exam_session.domain).all()
-        question_ids = [q.id for q in qs]
-        questions_by_id = {q.id: q for q in qs}
+    Exam.query.filter(Exam.id.in_(exam_ids)).update(
+        {Exam.paper_version: func.coalesce(Exam.paper_version, 0) + 1}, synchronize_session=False)
+    for exam_id in exam_ids:
+        answer_key_cache.invalidate(exam_id)
+        question_fragment_cache.invalidate(exam_id)
 
-    answered_ids = set()
-    for key, answers in responses_dict.items():
-        if not key.startswith('question_'):
+BLUEPRINT_QUESTION_TYPES = ('mcq_single', 'mcq_multi', 'short_text')
+
+def sample_blueprint_questions(exam, rng=None):
+    """Question ids drawn for one attempt of a blueprint exam, rule by rule, without repeats.
+
+    Each rule picks random positions in the dense slot numbering of its strata, so the cost
+    depends on the number of questions drawn, not on the size of the bank.
+    """
+    rng = rng or random.SystemRandom()
+    rules = ExamBlueprintRule.query.filter_by(exam_id=exam.id).order_by(ExamBlueprintRule.position, ExamBlueprintRule.id).all()
+    strata = QuestionPool.query.filter(QuestionPool.domain == exam.domain, QuestionPool.size > 0).all()
+    chosen = []
+    chosen_by_stratum = {}
+    for rule in rules:
+        groups = [g for g in strata
+                  if (rule.question_type is None or g.question_type == rule.question_type)
+                  and (rule.points is None or abs(g.points - rule.points) < 1e-9)]
+        pool_size = sum(g.size for g in groups)
+        # Draw extra positions to cover questions an earlier rule already took from these strata
+        taken = sum(chosen_by_stratum.get((g.question_type, g.points), 0) for g in groups)
+        positions = rng.sample(range(pool_size), min(pool_size, rule.count + taken))
+        picks = []  # (stratum, slot) in draw order
+        for position in positions:
+            for g in groups:
+                if position < g.size:
+                    picks.append(((g.question_type, g.points), position))
+                    break
+                position -= g.size
+        if not picks:
             continue
-        qid = int(key.replace('question_', ''))
-        answered_ids.add(qid)
-        question = questions_by_id.get(qid) or Question.query.get(qid)
-        if not question:
+        slots_by_stratum = {}
+        for stratum, slot in picks:
+            slots_by_stratum.setdefault(stratum, []).append(slot)
+        rows = (db.session.query(QuestionPoolSlot.question_type, QuestionPoolSlot.points, QuestionPoolSlot.slot, QuestionPoolSlot.question_id)
+                .filter(QuestionPoolSlot.domain == exam.domain,
+                        or_(*(and_(QuestionPoolSlot.question_type == qtype, QuestionPoolSlot.points == points,
+                                   QuestionPoolSlot.slot.in_(slots))
+                              for (qtype, points), slots in slots_by_stratum.items())))
+                .all())
+        by_position = {(row.question_type, row.points, row.slot): row.question_id for row in rows}
+        drawn = 0
+        already = set(chosen)
+        for stratum, slot in picks:
+            if drawn >= rule.count:
+                break
+            qid = by_position.get((stratum[0], stratum[1], slot))
+            if qid is None or qid in already:
+                continue
+            chosen.append(qid)
+            already.add(qid)
+            chosen_by_stratum[stratum] = chosen_by_stratum.get(stratum, 0) + 1
+            drawn += 1
+    rng.shuffle(chosen)
+    return chosen
+
+def exams_using_question(question_id):
+    """Exams whose paper includes the question, plus blueprint exams that may draw it."""
+    fixed = db.session.query(ExamQuestion.exam_id).filter_by(question_id=question_id)
+    sampling = (db.session.query(Exam.id)
+                .join(Question, Question.domain == Exam.domain)
+                .filter(Question.id == question_id,
+                        db.session.query(ExamBlueprintRule.id).filter(ExamBlueprintRule.exam_id == Exam.id).exists()))
+    return [eid for (eid,) in fixed.union(sampling).all()]
+
+def grade_answer(question, answers):
+    """Grade one compiled question from its submitted form values.
+
+    Returns (stored_answer, is_correct, awarded_points).
+    """
+    points = question.points
+    if question.question_type == 'short_text':
+        user_text = (answers[0] if answers else '').strip()
+        is_correct = question.matcher.matches(user_text)
+        return user_text, is_correct, (points if is_correct else 0.0)
+    if question.question_type == 'mcq_multi':
+        correct_set = question.correct_set
+        user_set = set(answers)
+        user_answer_store = ','.join(sorted(user_set))
+        if question.partial_credit and correct_set:
+            num_correct_selected = len(user_set & correct_set)
+            num_incorrect_selected = len(user_set - correct_set)
+            base = num_correct_selected / len(correct_set)
+            penalty = num_incorrect_selected / max(len(correct_set), 1)
+            raw = max(0.0, base - penalty)
+            awarded = round(raw * points, 2)
+            return user_answer_store, awarded == points, awarded
+        is_correct = user_set == correct_set
+        return user_answer_store, is_correct, (points if is_correct else 0.0)
+    # mcq_single
+    user_choice = answers[0] if answers else ''
+    is_correct = user_choice == question.correct_choice
+    return user_choice, is_correct, (points if is_correct else 0.0)
+
+def grade_submission(session_id, answer_key, responses_dict, answered_at, answer_times=None):
+    """Grade a whole submission against a compiled answer key without touching the database.
+
+    Answers for questions that are not on the paper are ignored. `answer_times` maps question
+    ids to when that answer was given (from autosave), defaulting to `answered_at`. Returns
+    the ExamResponse rows (one per paper question, blanks for unanswered ones) and the total score.
+    """
+    answer_times = answer_times or {}
+    rows = []
+    total_score = 0.0
+    for qid in answer_key.question_ids:
+        question = answer_key.questions[qid]
+        answers = responses_dict.get(f'question_{qid}')
+        if answers is None:
+            rows.append({'exam_session_id': session_id, 'question_id': qid, 'user_answer': '',
+                         'is_correct': False, 'awarded_points': 0.0, 'answered_at': answered_at})
             continue
-        awarded = 0.0
-        is_correct = False
-        if question.question_type == 'short_text':
-            user_text = (answers[0] if answers else '').strip().lower()
-            acceptable = [(a.strip().lower()) for a in (question.correct_answer_text or '').split(',') if a.strip()]
-            is_correct = user_text in acceptable if acceptable else False
-            awarded = question.points if is_correct else 0.0
-            user_answer_store = user_text
-        elif question.question_type == 'mcq_multi':
-            correct_set = set((question.correct_answer or '').split(','))
-            user_set = set(answers)
-            user_answer_store = ','.join(sorted(user_set))
-            if question.partial_credit and correct_set:
-                num_correct_selected = len(user_set & correct_set)
-                num_incorrect_selected = len(user_set - correct_set)
-                base = num_correct_selected / len(correct_set)
-                penalty = num_incorrect_selected / max(len(correct_set), 1)
-                raw = max(0.0, base - penalty)
-                awarded = round(raw * question.points, 2)
-                is_correct = awarded == question.points
-            else:
-                is_correct = user_set == correct_set
-                awarded = question.points if is_correct else 0.0
-        else:  # mcq_single
-            user_choice = answers[0] if answers else ''
-            user_answer_store = user_choice
-            correct_choice = (question.correct_answer or '').split(',')[0]
-            is_correct = user_choice == correct_choice
-            awarded = question.points if is_correct else 0.0
-        response = ExamResponse(
-            exam_session_id=session_id,
-            question_id=qid,
-            user_answer=user_answer_store,
-            is_correct=is_correct,
-            awarded_points=awarded
-        )
-        db.session.add(response)
+        user_answer, is_correct, awarded = grade_answer(question, answers)
+        rows.append({'exam_session_id': session_id, 'question_id': qid, 'user_answer': user_answer,
+                     'is_correct': is_correct, 'awarded_points': awarded,
+                     'answered_at': answer_times.get(qid, answered_at)})
         total_score += awarded
-    # Fill unanswered questions as blanks
-    for qid in question_ids:
-        if qid in answered_ids:
-            continue
-        response = ExamResponse(
-            exam_session_id=session_id,
-            question_id=qid,
-            user_answer='',
-            is_correct=False,
-            awarded_points=0.0
-        )
-        db.session.add(response)
-    exam_session.score = total_score
-    exam_session.is_completed = True
+    return rows, total_score
+
+GRADING_BATCH_SIZE = 50
+GRADING_MAX_ATTEMPTS = 3
+GRADING_CLAIM_TIMEOUT = timedelta(minutes=5)  # a running job older than this is assumed orphaned
+GRADING_MAX_BACKOFF_SECONDS = 30.0  # longest pause of a worker after a failed batch (e.g. "database is locked")
+# Grade a queued submission in the results request itself once it has waited this long, so
+# results still arrive when no grading worker is running. 0 disables the fallback.
+GRADING_FALLBACK_SECONDS = int(os.environ.get('EXAM_GRADING_FALLBACK_SECONDS', '30'))
+
+def submit_exam(session_id):
+    """Queue a session for grading. Only the raw form answers are stored; workers do the rest."""
+    exam_session = ExamSession.query.get(session_id)
+    if not exam_session or exam_session.is_completed or exam_session.submitted_at:
+        return
+    answers = {key: values for key, values in request.form.to_dict(flat=False).items() if key.startswith('question_')}
+    # Browsers leave cleared checkboxes out of the form; a displayed question that isn't posted
+    # was cleared, so it must override its autosaved draft rather than fall back to it
+    for qid in request.form.getlist('displayed_question'):
+        answers.setdefault(f'question_{qid}', [])
+    now = datetime.utcnow()
+    db.session.add(GradingJob(exam_session_id=session_id, answers=json.dumps(answers), submitted_at=now))
+    exam_session.submitted_at = now
     db.session.commit()
 
+def grade_job(job):
+    """Grade one queued submission. Only reads from the database.
+
+    Returns (exam_session, response rows, total score, question count), or None when the
+    session no longer needs grading.
+    """
+    exam_session = db.session.get(ExamSession, job.exam_session_id)
+    if exam_session is None or exam_session.is_completed:
+        return None
+    # Start from autosaved drafts; answers posted with the final submit take precedence
+    drafts, draft_times = load_draft_answers(exam_session.id, with_times=True)
+    responses_dict = {f'question_{qid}': values for qid, values in drafts.items()}
+    form_answers = json.loads(job.answers)
+    responses_dict.update(form_answers)
+    # Keep the autosave time for answers the final submit didn't change
+    answer_times = {qid: saved_at for qid, saved_at in draft_times.items()
+                    if form_answers.get(f'question_{qid}', drafts[qid]) == drafts[qid]}
+    answer_key = answer_key_for_session(exam_session)
+    rows, total_score = grade_submission(exam_session.id, answer_key, responses_dict, job.submitted_at, answer_times)
+    return exam_session, rows, total_score, len(answer_key.question_ids)
+
+def complete_grading_job(job, graded):
+    """Store a graded submission, complete its session and drop the job. Does not commit."""
+    if graded is not None:
+        exam_session, rows, total_score, question_count = graded
+        if rows:
+            db.session.execute(ExamResponse.__table__.insert(), rows)
+        DraftAnswer.query.filter_by(exam_session_id=exam_session.id).delete(synchronize_session=False)
+        exam_session.score = total_score
+        exam_session.total_questions = question_count
+        exam_session.is_completed = True
+        fold_item_statistics([exam_session.id])
+        exam_session.item_stats_applied = True
+        if exam_session.exam_id:
+            # Ranked by submission time, not by when a worker got to it
+            record_exam_result(exam_session, completed_at=job.submitted_at)
+    db.session.delete(job)
+
+def claim_grading_jobs(limit, session_ids=None):
+    """Mark up to `limit` queued jobs as running (oldest first) and return their session ids.
+
+    Opens with a write so concurrent workers serialize on the SQLite lock instead of
+    claiming the same jobs.
+    """
+    db.session.commit()
+    db.session.execute(text("UPDATE grading_job SET status = status WHERE 0"))
+    now = datetime.utcnow()
+    query = GradingJob.query.filter(or_(GradingJob.status == 'pending',
+                                        and_(GradingJob.status == 'running',
+                                             GradingJob.claimed_at < now - GRADING_CLAIM_TIMEOUT)))
+    if session_ids is not None:
+        query = query.filter(GradingJob.exam_session_id.in_(session_ids))
+    claimed = [sid for (sid,) in (query.with_entities(GradingJob.exam_session_id)
+                                  .order_by(GradingJob.submitted_at, GradingJob.exam_session_id)
+                                  .limit(limit)
+                                  .all())]
+    if not claimed:
+        db.session.rollback()
+        return []
+    (GradingJob.query
+     .filter(GradingJob.exam_session_id.in_(claimed))
+     .update({GradingJob.status: 'running', GradingJob.claimed_at: now,
+              GradingJob.attempts: func.coalesce(GradingJob.attempts, 0) + 1}, synchronize_session=False))
+    db.session.commit()
+    return claimed
+
+def process_grading_batch(limit=GRADING_BATCH_SIZE, session_ids=None):
+    """Claim and grade up to `limit` queued submissions. Returns the number of jobs claimed.
+
+    Grading only reads, so workers grade their batches in parallel. The results are then
+    written in one transaction that opens with a dummy UPDATE, so it holds the SQLite write
+    lock before its first read. A submission that fails is rolled back on its own and
+    retried by a later batch, up to GRADING_MAX_ATTEMPTS times.
+    """
+    claimed = claim_grading_jobs(limit, session_ids)
+    if not claimed:
+        return 0
+    jobs = GradingJob.query.filter(GradingJob.exam_session_id.in_(claimed)).order_by(GradingJob.submitted_at).all()
+    graded, failed = {}, {}
+    for job in jobs:
+        try:
+            graded[job.exam_session_id] = grade_job(job)
+        except Exception as e:
+            app.logger.exception('Grading session %s failed', job.exam_session_id)
+            failed[job.exam_session_id] = e
+    db.session.execute(text("UPDATE grading_job SET status = status WHERE 0"))
+    for job in jobs:
+        if job.exam_session_id in graded:
+            try:
+                with db.session.begin_nested():
+                    complete_grading_job(job, graded[job.exam_session_id])
+                continue
+            except Exception as e:
+                app.logger.exception('Saving the grades of session %s failed', job.exam_session_id)
+                failed[job.exam_session_id] = e
+        job.status = 'failed' if (job.attempts or 0) >= GRADING_MAX_ATTEMPTS else 'pending'
+        job.error = str(failed[job.exam_session_id])[:1000]
+    db.session.commit()
+    return len(claimed)
+
+def grade_if_overdue(exam_session):
+    """Results-page fallback: grade a submission in-request if no worker has picked it up in time."""
+    if not GRADING_FALLBACK_SECONDS or exam_session.is_completed or not exam_session.submitted_at:
+        return
+    if datetime.utcnow() - exam_session.submitted_at >= timedelta(seconds=GRADING_FALLBACK_SECONDS):
+        process_grading_batch(1, session_ids=[exam_session.id])
+        db.session.refresh(exam_session)
+
+def run_grading_worker(batch_size=GRADING_BATCH_SIZE, poll_interval=1.0, drain=False):
+    """Grade queued submissions until stopped (or, with `drain`, until the queue is empty).
+
+    A batch that fails as a whole (the database stayed locked, a timed-out claim was taken
+    over by another worker) is rolled back and retried after a pause that doubles up to
+    GRADING_MAX_BACKOFF_SECONDS, so the worker outlives deadline bursts.
+    """
+    processed = 0
+    backoff = poll_interval
+    while True:
+        try:
+            claimed = process_grading_batch(batch_size)
+        except SQLAlchemyError:
+            db.session.rollback()
+            app.logger.exception('Grading batch failed; retrying in %.1fs', backoff)
+            time.sleep(backoff)
+            backoff = min(max(backoff, 0.1) * 2, GRADING_MAX_BACKOFF_SECONDS)
+            continue
+        backoff = poll_interval
+        processed += claimed
+        if not claimed:
+            if drain:
+                return processed
+            time.sleep(poll_interval)
+
+def _grading_worker_process(batch_size, poll_interval, drain):
+    with app.app_context():
+        db.engine.dispose(close=False)  # don't share the parent's SQLite connections
+        run_grading_worker(batch_size, poll_interval, drain)
+
+@app.cli.command('grading-worker')
+@click.option('--processes', default=2, show_default=True, help='Worker processes to run.')
+@click.option('--batch-size', default=GRADING_BATCH_SIZE, show_default=True, help='Submissions graded per transaction.')
+@click.option('--poll-interval', default=1.0, show_default=True, help='Seconds to wait when the queue is empty.')
+@click.option('--drain', is_flag=True, help='Exit once the queue is empty instead of waiting for more.')
+@click.option('--retry-failed', is_flag=True, help='Queue submissions that failed to grade again first.')
+def grading_worker_command(processes, batch_size, poll_interval, drain, retry_failed):
+    """Grade submitted exams from the grading queue with a pool of worker processes."""
+    if retry_failed:
+        retried = (GradingJob.query.filter_by(status='failed')
+                   .update({GradingJob.status: 'pending', GradingJob.attempts: 0}, synchronize_session=False))
+        db.session.commit()
+        print(f"Re-queued {retried} failed submission(s)")
+    if processes <= 1:
+        processed = run_grading_worker(batch_size, poll_interval, drain)
+        print(f"✓ Graded {processed} submission(s)")
+        return
+    workers = [multiprocessing.Process(target=_grading_worker_process, args=(batch_size, poll_interval, drain), daemon=True)
+               for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    print(f"Grading with {processes} worker process(es); Ctrl+C to stop")
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.terminate()
+    if drain:
+        print(f"✓ Grading queue drained ({db.session.query(func.count(GradingJob.exam_session_id)).scalar()} job(s) left)")
+
+def exam_rank(exam_session):
+    """(rank, graded total, exact?) for a completed session: exact inside the leaderboard,
+    otherwise estimated from the histogram (sessions in the same whole-percent bucket count as ties)."""
+    aggregate = load_exam_aggregate(exam_session.exam_id)
+    total = aggregate.graded_count or 0
+    entries = [e.session_id for e, _ in exam_leaderboard(exam_session.exam_id)]
+    if exam_session.id in entries:
+        return entries.index(exam_session.id) + 1, total, True
+    tq = exam_session.total_questions or 0
+    percent = (exam_session.score or 0.0) * 100.0 / tq if tq else 0.0
+    above = (db.session.query(func.coalesce(func.sum(ExamScoreBucket.count), 0))
+             .filter(ExamScoreBucket.exam_id == exam_session.exam_id, ExamScoreBucket.bucket > score_bucket(percent))
+             .scalar())
+    return above + 1, total, False
+
+@app.route('/student/rank/<int:session_id>')
+@login_required
+def exam_rank_view(session_id):
+    if current_user.role != 'student':
+        flash('Access denied', 'error')
+        return redirect(url_for('index'))
+    exam_session = ExamSession.query.get_or_404(session_id)
+    if exam_session.user_id != current_user.id:
+        flash('Access denied', 'error')
+        return redirect(url_for('student_dashboard'))
+    if not exam_session.is_completed or not exam_session.exam_id:
+        flash('Ranking is only available for completed exams.', 'info')
+        return redirect(url_for('student_results_list'))
+    exam = Exam.query.get_or_404(exam_session.exam_id)
+    rank, total, exact = exam_rank(exam_session)
+    stats = compute_exam_result_stats(exam)
+    leaderboard = exam_leaderboard(exam.id, limit=10)
+    db.session.commit()  # keeps aggregates rebuilt by exam_rank / compute_exam_result_stats
+    return render_template('exam_rank.html', exam=exam, exam_session=exam_session, rank=rank, total=total,
+                           exact=exact, stats=stats, leaderboard=leaderboard)
+
+def load_session_responses(exam_session):
+    """A session's responses in paper order plus a {question_id: Question} map, in one query.
+
+    Only the questions actually answered are loaded. grade_submission inserts one response per
+    question in the session's own (frozen or sampled) paper order, so response id order is
+    paper order even after the exam's questions are edited.
+    """
+    rows = (db.session.query(ExamResponse, Question)
+            .outerjoin(Question, Question.id == ExamResponse.question_id)
+            .filter(ExamResponse.exam_session_id == exam_session.id)
+            .order_by(ExamResponse.id)
+            .all())
+    responses = [response for response, _ in rows]
+    questions = {response.question_id: question for response, question in rows if question is not None}
+    return responses, questions
+
+def session_option_labels(exam_session, responses):
+    """`responses` in the order the session showed them, plus {question_id: {canonical letter: shown letter}}.
+
+    Shuffled papers label options by position (see session_layout), so results have to quote
+    the letters the student actually read. Unshuffled sessions come back unchanged with no labels.
+    """
+    if not exam_session.exam_id or exam_session.paper_version is None:
+        return responses, {}
+    if not load_paper_snapshot(exam_session.exam_id, exam_session.paper_version).shuffle:
+        return responses, {}
+    layout = session_layout(exam_session.id, session_paper(exam_session))
+    position = {question.id: index for index, (question, _) in enumerate(layout)}
+    labels = {question.id: dict(zip(letters, OPTION_ORDER)) for question, letters in layout if letters != OPTION_ORDER}
+    responses = sorted(responses, key=lambda response: position.get(response.question_id, len(position)))
+    return responses, labels
+
 @app.route('/exam_results/<int:session_id>')
 @login_required
 def exam_results(session_id):
@@ -1082,9 +2388,17 @@ def exam_results(session_id):
     if exam_session.user_id != current_user.id:
         flash('Access denied', 'error')
         return redirect(url_for('student_dashboard'))
-    responses = ExamResponse.query.filter_by(exam_session_id=session_id).all()
-    questions = Question.query.filter_by(domain=exam_session.domain).all()
-    return render_template('exam_results.html', exam_session=exam_session, responses=responses, questions=questions)
+    grade_if_overdue(exam_session)
+    if exam_session.submitted_at and not exam_session.is_completed:
+        job = db.session.get(GradingJob, exam_session.id)
+        return render_template('exam_grading.html', exam_session=exam_session, job=job)
+    responses, questions = load_session_responses(exam_session)
+    responses, option_labels = session_option_labels(exam_session, responses)
+    # Students see the acceptable answers, not the matcher syntax (regexes, "~" typo markers)
+    accepted_answers = {qid: answer_matching.display_answers(question.correct_answer_text)
+                        for qid, question in questions.items() if question.question_type == 'short_text'}
+    return render_template('exam_results.html', exam_session=exam_session, responses=responses, questions=questions,
+                           option_labels=option_labels, accepted_answers=accepted_answers)
 
 @app.route('/student/results')
 @login_required
@@ -1096,101 +2410,607 @@ def student_results_list():
                 .filter_by(user_id=current_user.id, is_completed=True)
                 .order_by(ExamSession.end_time.desc())
                 .all())
-    return render_template('student_results.html', sessions=sessions)
+    grading = (ExamSession.query
+               .filter(ExamSession.user_id == current_user.id, ExamSession.is_completed == False,
+                       ExamSession.submitted_at.isnot(None))
+               .order_by(ExamSession.submitted_at.desc())
+               .all())
+    return render_template('student_results.html', sessions=sessions, grading=grading)
 
 @app.route('/admin/session/<int:session_id>')
+@admin_required(domain_from=session_domain, denied_message='You are not allowed to view this exam session.', denied_redirect='admin_results')
 def admin_view_session(session_id):
-    if not session.get('admin_user'):
-        flash('Please log in as admin.', 'error')
-        return redirect(url_for('admin_login'))
-    admins = load_admins()
-    admin_info = next((a for a in admins if a.get('username') == session.get('admin_user')), None)
-    if not admin_info:
-        session.pop('admin_user', None)
-        session.pop('admin_domains', None)
-        flash('Admin account not found. Please log in again.', 'error')
-        return redirect(url_for('admin_login'))
-    all_domains = ['web_dev', 'ml', 'data_science']
-    admin_domains = admin_info.get('domain', [])
-    if isinstance(admin_domains, str):
-        if admin_domains == 'all':
-            allowed_domains = all_domains
-        else:
-            allowed_domains = [admin_domains]
-    else:
-        allowed_domains = admin_domains if admin_domains else all_domains
     exam_session = ExamSession.query.get_or_404(session_id)
     if not exam_session.is_completed:
         flash('Exam is not completed yet.', 'error')
         return redirect(url_for('admin_results'))
-    if exam_session.domain not in allowed_domains:
-        flash('You are not allowed to view this exam session.', 'error')
-        return redirect(url_for('admin_results'))
-    responses = ExamResponse.query.filter_by(exam_session_id=session_id).all()
-    questions = Question.query.filter_by(domain=exam_session.domain).all()
+    responses, questions = load_session_responses(exam_session)
+    responses, option_labels = session_option_labels(exam_session, responses)
     student = User.query.get(exam_session.user_id)
     student_username = student.username if student else f'Student #{exam_session.user_id}'
     return render_template('admin_exam_view.html',
                            exam_session=exam_session,
                            responses=responses,
                            questions=questions,
+                           option_labels=option_labels,
                            student_username=student_username)
 
+ITEM_STATS_BATCH_SESSIONS = 500
+
+def fold_item_statistics(session_ids):
+    """Add the responses of the completed sessions `session_ids` to QuestionStat.
+
+    Only issues an upsert of increments, so complete_grading_job runs it in the transaction
+    that records the result. Does not commit or mark the sessions as applied.
+    """
+    rows = (db.session.query(ExamResponse.exam_session_id, ExamResponse.question_id, ExamResponse.awarded_points,
+                             ExamResponse.is_correct, ExamResponse.user_answer, ExamResponse.answered_at,
+                             Question.points, Question.question_type, ExamSession.start_time, ExamSession.end_time)
+            .join(Question, Question.id == ExamResponse.question_id)
+            .join(ExamSession, ExamSession.id == ExamResponse.exam_session_id)
+            .filter(ExamResponse.exam_session_id.in_(session_ids))
+            .all())
+    if rows:
+        columns = list(zip(*rows))
+        answers = np.array([a or '' for a in columns[4]], dtype=str)
+        answered = np.char.str_len(np.char.strip(answers)) > 0
+        is_mcq = np.array([t in ('mcq_single', 'mcq_multi', None) for t in columns[7]], dtype=bool)
+        answered_at = np.array(columns[5], dtype='datetime64[us]')
+        start = np.array(columns[8], dtype='datetime64[us]')
+        end = np.array(columns[9], dtype='datetime64[us]')
+        seconds = (answered_at - start) / np.timedelta64(1, 's')
+        # Only answers given within the exam window count towards time-to-answer
+        valid_time = answered & ~np.isnat(answered_at) & (answered_at >= start) & (answered_at <= end)
+        seconds = np.where(valid_time, seconds, np.nan)
+        qids, sums = item_analysis.response_sums(
+            session_ids=np.array(columns[0], dtype=np.int64),
+            question_ids=np.array(columns[1], dtype=np.int64),
+            awarded=np.array([a or 0.0 for a in columns[2]], dtype=np.float64),
+            points=np.array([1.0 if p is None else p for p in columns[6]], dtype=np.float64),
+            is_correct=np.array([bool(c) for c in columns[3]], dtype=bool),
+            selected=item_analysis.selected_options(answers, is_mcq),
+            seconds=seconds,
+        )
+        now = datetime.utcnow()
+        values = []
+        for i, qid in enumerate(qids.tolist()):
+            row = {'question_id': qid, 'updated_at': now}
+            for field in item_analysis.SUM_FIELDS:
+                value = float(sums[field][i])
+                row[field] = int(round(value)) if field.endswith('_count') or field == 'responses' else value
+            values.append(row)
+        stmt = sqlite_insert(QuestionStat.__table__).values(values)
+        table = QuestionStat.__table__
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['question_id'],
+            set_={**{field: func.coalesce(table.c[field], 0) + stmt.excluded[field] for field in item_analysis.SUM_FIELDS},
+                  'updated_at': stmt.excluded.updated_at})
+        db.session.execute(stmt)
+
+def _apply_item_stats_batch(batch_sessions):
+    """Fold the responses of up to `batch_sessions` unprocessed sessions into QuestionStat.
+
+    Backfill for sessions completed before statistics were folded in as results are
+    recorded. Runs as one transaction that opens with a write, so concurrent runs serialize
+    on the SQLite lock instead of counting the same sessions twice. Returns the sessions processed.
+    """
+    pending = (ExamSession.is_completed == True,
+               or_(ExamSession.item_stats_applied == False, ExamSession.item_stats_applied.is_(None)))
+    db.session.commit()
+    db.session.execute(text("UPDATE exam_session SET item_stats_applied = item_stats_applied WHERE 0"))
+    session_ids = [sid for (sid,) in (db.session.query(ExamSession.id)
+                                      .filter(*pending)
+                                      .order_by(ExamSession.id)
+                                      .limit(batch_sessions)
+                                      .all())]
+    if not session_ids:
+        db.session.rollback()
+        return 0
+    fold_item_statistics(session_ids)
+    (ExamSession.query
+     .filter(ExamSession.id.in_(session_ids))
+     .update({ExamSession.item_stats_applied: True}, synchronize_session=False))
+    db.session.commit()
+    return len(session_ids)
+
+def update_item_statistics(max_sessions=None, batch_sessions=ITEM_STATS_BATCH_SESSIONS):
+    """Fold completed sessions whose responses aren't in the item-analysis summary table yet."""
+    processed = 0
+    while max_sessions is None or processed < max_sessions:
+        limit = batch_sessions if max_sessions is None else min(batch_sessions, max_sessions - processed)
+        done = _apply_item_stats_batch(limit)
+        if not done:
+            break
+        processed += done
+    return processed
+
+@app.cli.command('update-item-stats')
+def update_item_stats_command():
+    """Backfill item-analysis statistics from sessions completed before they were kept up to date."""
+    processed = update_item_statistics()
+    print(f"✓ Item statistics updated from {processed} session(s)")
+
+SIMILARITY_BATCH_QUESTIONS = 1000
+SIMILARITY_COLUMNS = (Question.id, Question.domain, Question.question_text,
+                      Question.option_a, Question.option_b, Question.option_c, Question.option_d)
+DUPLICATE_PAIR_BUCKET = 50  # buckets larger than this are compared against their first member only
+DUPLICATE_REPORT_GROUPS = 200
+
+def question_signature(question):
+    return question_similarity.signature(question_similarity.fingerprint_text(
+        question.question_text, (question.option_a, question.option_b, question.option_c, question.option_d)))
+
+def index_question_signatures(questions, replace=True):
+    """(Re)write the signature and LSH buckets of each question (or SIMILARITY_COLUMNS row).
+
+    Pass replace=False for questions known to have no signature yet. Does not commit.
+    Returns {question_id: signature}.
+    """
+    if not questions:
+        return {}
+    ids = [q.id for q in questions]
+    PendingQuestionSignature.query.filter(PendingQuestionSignature.question_id.in_(ids)).delete(synchronize_session=False)
+    if replace:
+        QuestionSignature.query.filter(QuestionSignature.question_id.in_(ids)).delete(synchronize_session=False)
+        QuestionLshBucket.query.filter(QuestionLshBucket.question_id.in_(ids)).delete(synchronize_session=False)
+    signatures = {q.id: question_signature(q) for q in questions}
+    db.session.execute(QuestionSignature.__table__.insert(), [
+        {'question_id': q.id, 'domain': q.domain, 'signature': question_similarity.to_bytes(signatures[q.id])}
+        for q in questions])
+    db.session.execute(QuestionLshBucket.__table__.insert(), [
+        {'domain': q.domain, 'bucket': key, 'question_id': q.id}
+        for q in questions for key in question_similarity.band_keys(signatures[q.id])])
+    return signatures
+
+def update_similarity_index(max_questions=None, batch_questions=SIMILARITY_BATCH_QUESTIONS):
+    """Sign the questions queued in pending_question_signature (bulk imports, setup data, edits made outside the app).
+
+    The queue is read in primary-key order, so an empty or short queue costs a few lookups
+    however large the bank is.
+    """
+    processed = 0
+    while max_questions is None or processed < max_questions:
+        limit = batch_questions if max_questions is None else min(batch_questions, max_questions - processed)
+        rows = (db.session.query(*SIMILARITY_COLUMNS)
+                .join(PendingQuestionSignature, PendingQuestionSignature.question_id == Question.id)
+                .order_by(PendingQuestionSignature.question_id)
+                .limit(limit)
+                .all())
+        if not rows:
+            break
+        index_question_signatures(rows, replace=False)
+        db.session.commit()
+        processed += len(rows)
+    return processed
+
+def find_similar_questions(domain, signature, exclude_id=None, threshold=question_similarity.DUPLICATE_THRESHOLD, limit=5):
+    """[(question, similarity)] of questions in `domain` at least `threshold` similar to `signature`."""
+    candidates = (db.session.query(QuestionLshBucket.question_id)
+                  .filter(QuestionLshBucket.domain == domain,
+                          QuestionLshBucket.bucket.in_(question_similarity.band_keys(signature))))
+    if exclude_id is not None:
+        candidates = candidates.filter(QuestionLshBucket.question_id != exclude_id)
+    rows = (db.session.query(QuestionSignature.question_id, QuestionSignature.signature)
+            .filter(QuestionSignature.question_id.in_(candidates))
+            .all())
+    if not rows:
+        return []
+    scores = question_similarity.similarity(signature, [question_similarity.from_bytes(sig) for _, sig in rows])
+    matches = sorted(((float(score), qid) for (qid, _), score in zip(rows, scores) if score >= threshold), reverse=True)[:limit]
+    questions = {q.id: q for q in Question.query.filter(Question.id.in_([qid for _, qid in matches])).all()}
+    return [(questions[qid], score) for score, qid in matches if qid in questions]
+
+def find_domain_duplicates(domain, threshold=question_similarity.DUPLICATE_THRESHOLD, max_groups=DUPLICATE_REPORT_GROUPS):
+    """Group the near-duplicate questions of a domain, largest groups first.
+
+    Only questions sharing an LSH bucket are compared, so the work grows with the number of
+    bucket collisions instead of the square of the bank size. Candidate pairs are verified
+    on their signatures and merged into groups with union-find.
+    Returns [(questions ordered by id, highest pair similarity)].
+    """
+    shared = (db.session.query(QuestionLshBucket.bucket)
+              .filter(QuestionLshBucket.domain == domain)
+              .group_by(QuestionLshBucket.bucket)
+              .having(func.count() > 1))
+    rows = (db.session.query(QuestionLshBucket.bucket, QuestionLshBucket.question_id)
+            .filter(QuestionLshBucket.domain == domain, QuestionLshBucket.bucket.in_(shared))
+            .order_by(QuestionLshBucket.bucket, QuestionLshBucket.question_id)
+            .all())
+    members = {}
+    for bucket, qid in rows:
+        members.setdefault(bucket, []).append(qid)
+    pairs = set()
+    for ids in members.values():
+        if len(ids) <= DUPLICATE_PAIR_BUCKET:
+            pairs.update((a, b) for i, a in enumerate(ids) for b in ids[i + 1:])
+        else:
+            pairs.update((ids[0], b) for b in ids[1:])
+    if not pairs:
+        return []
+    pairs = sorted(pairs)
+    involved = sorted({qid for pair in pairs for qid in pair})
+    in_shared_buckets = (db.session.query(QuestionLshBucket.question_id)
+                         .filter(QuestionLshBucket.domain == domain, QuestionLshBucket.bucket.in_(shared)))
+    signatures = dict(db.session.query(QuestionSignature.question_id, QuestionSignature.signature)
+                      .filter(QuestionSignature.question_id.in_(in_shared_buckets)).all())
+    position = {qid: i for i, qid in enumerate(involved)}
+    matrix = np.stack([question_similarity.from_bytes(signatures[qid]) for qid in involved])
+    left = np.array([position[a] for a, _ in pairs])
+    right = np.array([position[b] for _, b in pairs])
+    scores = (matrix[left] == matrix[right]).mean(axis=1)
+
+    parent = {}
+    def find(qid):
+        parent.setdefault(qid, qid)
+        while parent[qid] != qid:
+            parent[qid] = parent[parent[qid]]
+            qid = parent[qid]
+        return qid
+    similar = [(a, b, score) for (a, b), score in zip(pairs, scores.tolist()) if score >= threshold]
+    for a, b, _ in similar:
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+    groups, best = {}, {}
+    for qid in list(parent):
+        groups.setdefault(find(qid), []).append(qid)
+    for a, _, score in similar:
+        best[find(a)] = max(best.get(find(a), 0.0), score)
+    ordered = sorted(groups.items(), key=lambda item: (-len(item[1]), item[0]))[:max_groups]
+    questions = {q.id: q for q in Question.query.filter(Question.id.in_([qid for _, ids in ordered for qid in ids])).all()}
+    return [([questions[qid] for qid in sorted(ids) if qid in questions], best[r]) for r, ids in ordered]
+
+@app.route('/admin/questions/<domain>/duplicates')
+@admin_required(domain_from=url_domain, denied_message='You are not allowed to view questions for this domain.')
+def question_duplicates(domain):
+    # Catch up on a bounded number of unsigned questions; the CLI command handles backlogs
+    update_similarity_index(max_questions=SIMILARITY_BATCH_QUESTIONS)
+    groups = find_domain_duplicates(domain)
+    return render_template('question_duplicates.html', domain=domain, groups=groups,
+                           threshold=question_similarity.DUPLICATE_THRESHOLD, group_limit=DUPLICATE_REPORT_GROUPS)
+
+@app.cli.command('update-similarity-index')
+def update_similarity_index_command():
+    """Compute duplicate-detection signatures for every question that lacks one."""
+    processed = update_similarity_index()
+    print(f"✓ Similarity index updated for {processed} question(s)")
+
+EXPORT_BATCH_SIZE = 1000
+
+def stream_csv(header, rows, gzip_output=False, flush_every=EXPORT_BATCH_SIZE):
+    """Yield CSV (optionally gzip-compressed) in chunks so exports never hold the whole file."""
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    compressor = zlib.compressobj(wbits=31) if gzip_output else None  # wbits=31 -> gzip container
+
+    def drain():
+        data = buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate(0)
+        return compressor.compress(data) if compressor else data
+
+    writer.writerow(header)
+    for i, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if i % flush_every == 0:
+            chunk = drain()
+            if chunk:
+                yield chunk
+    chunk = drain()
+    if compressor:
+        chunk += compressor.flush()
+    if chunk:
+        yield chunk
+
+def csv_response(header, rows, filename):
+    gzip_output = request.args.get('gzip') == '1'
+    if gzip_output:
+        filename += '.gz'
+    return app.response_class(stream_with_context(stream_csv(header, rows, gzip_output)),
+                              mimetype='application/gzip' if gzip_output else 'text/csv',
+                              headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+def parse_export_filters(scope):
+    """SQL filters for completed sessions from ?start=, ?end= (YYYY-MM-DD, by completion date),
+    ?exam_id= and ?domain=, limited to the admin's domains. Returns (filters, error_message)."""
+    filters = [ExamSession.is_completed == True, scope.domain_filter(ExamSession.domain)]
+    try:
+        if request.args.get('start'):
+            filters.append(SESSION_COMPLETED_AT >= datetime.strptime(request.args['start'], '%Y-%m-%d'))
+        if request.args.get('end'):
+            filters.append(SESSION_COMPLETED_AT < datetime.strptime(request.args['end'], '%Y-%m-%d') + timedelta(days=1))
+    except ValueError:
+        return None, 'Dates must be in YYYY-MM-DD format.'
+    if request.args.get('exam_id'):
+        try:
+            filters.append(ExamSession.exam_id == int(request.args['exam_id']))
+        except ValueError:
+            return None, 'Invalid exam id.'
+    domain = request.args.get('domain')
+    if domain:
+        if not scope.allows(domain):
+            return None, 'You are not allowed to export results for this domain.'
+        filters.append(ExamSession.domain == domain)
+    return filters, None
+
+def correct_answer_display(question):
+    if question.question_type == 'short_text':
+        return question.correct_answer_text or ''
+    letters = [c for c in (question.correct_answer or '').split(',') if c]
+    texts = [getattr(question, f'option_{c.lower()}', '') or '' for c in letters]
+    if not letters:
+        return ''
+    return f"{','.join(letters)}. {' | '.join(texts)}"
+
 @app.route('/admin/export/session/<int:session_id>')
+@admin_required(domain_from=session_domain, denied_redirect='admin_results')
 def export_session_csv(session_id):
-    if not session.get('admin_user'):
-        return redirect(url_for('admin_login'))
-    admins = load_admins()
-    admin_info = next((a for a in admins if a.get('username') == session.get('admin_user')), None)
-    exam_session = ExamSession.query.get_or_404(session_id)
-    # domain check
-    allowed = admin_info.get('domain', 'all') if admin_info else 'all'
-    if isinstance(allowed, str):
-        if allowed != 'all' and exam_session.domain != allowed:
-            flash('Not allowed.', 'error')
-            return redirect(url_for('admin_results'))
-    else:
-        if allowed and exam_session.domain not in allowed:
-            flash('Not allowed.', 'error')
-            return redirect(url_for('admin_results'))
-    responses = ExamResponse.query.filter_by(exam_session_id=session_id).all()
-    questions = {q.id: q for q in Question.query.filter_by(domain=exam_session.domain).all()}
-    si = StringIO()
-    writer = csv.writer(si)
-    writer.writerow(['Question ID', 'Question', 'User Answer', 'Correct', 'Correct Answer'])
-    for r in responses:
-        q = questions.get(r.question_id)
-        if q and q.question_type == 'short_text':
-            correct_disp = (q.correct_answer_text or '')
-        elif q:
-            correct_text = getattr(q, f"option_{(q.correct_answer or '').lower()}") if q.correct_answer else ''
-            correct_disp = f"{q.correct_answer}. {correct_text}"
-        else:
-            correct_disp = ''
-        writer.writerow([r.question_id, q.question_text if q else '', r.user_answer, 'YES' if r.is_correct else 'NO', correct_disp])
-    output = si.getvalue()
-    return app.response_class(output, mimetype='text/csv', headers={'Content-Disposition': f'attachment; filename=session_{session_id}.csv'})
+    ExamSession.query.get_or_404(session_id)
+    rows = (db.session.query(ExamResponse.question_id, ExamResponse.user_answer, ExamResponse.is_correct,
+                             Question.question_text, Question.question_type, Question.correct_answer,
+                             Question.correct_answer_text, Question.option_a, Question.option_b,
+                             Question.option_c, Question.option_d)
+            .outerjoin(Question, Question.id == ExamResponse.question_id)
+            .filter(ExamResponse.exam_session_id == session_id)
+            .order_by(ExamResponse.id)
+            .yield_per(EXPORT_BATCH_SIZE))
+
+    def generate():
+        for r in rows:
+            has_question = r.question_text is not None
+            yield [r.question_id, r.question_text or '', r.user_answer, 'YES' if r.is_correct else 'NO',
+                   correct_answer_display(r) if has_question else '']
+
+    return csv_response(['Question ID', 'Question', 'User Answer', 'Correct', 'Correct Answer'],
+                        generate(), f'session_{session_id}.csv')
 
 @app.route('/admin/export/all')
+@admin_required()
 def export_all_csv():
-    if not session.get('admin_user'):
-        return redirect(url_for('admin_login'))
-    admins = load_admins()
-    admin_info = next((a for a in admins if a.get('username') == session.get('admin_user')), None)
-    all_domains = ['web_dev', 'ml', 'data_science']
-    allowed = admin_info.get('domain', []) if admin_info else []
-    if isinstance(allowed, str):
-        allowed_domains = all_domains if allowed == 'all' else [allowed]
-    else:
-        allowed_domains = allowed if allowed else all_domains
-    sessions = ExamSession.query.filter(ExamSession.is_completed == True, ExamSession.domain.in_(allowed_domains)).all()
-    si = StringIO()
-    writer = csv.writer(si)
-    writer.writerow(['Session ID', 'User ID', 'Domain', 'Score', 'Total Questions', 'Start', 'End'])
-    for s in sessions:
-        writer.writerow([s.id, s.user_id, s.domain, s.score, s.total_questions, s.start_time.isoformat(), s.end_time.isoformat()])
-    output = si.getvalue()
-    return app.response_class(output, mimetype='text/csv', headers={'Content-Disposition': 'attachment; filename=results.csv'})
+    filters, error = parse_export_filters(get_admin_scope())
+    if error:
+        flash(error, 'error')
+        return redirect(url_for('admin_results'))
+    rows = (db.session.query(ExamSession.id, ExamSession.user_id, ExamSession.domain, ExamSession.score,
+                             ExamSession.total_questions, ExamSession.start_time, ExamSession.end_time)
+            .filter(*filters)
+            .order_by(ExamSession.id)
+            .yield_per(EXPORT_BATCH_SIZE))
+
+    def generate():
+        for s in rows:
+            yield [s.id, s.user_id, s.domain, s.score, s.total_questions, s.start_time.isoformat(), s.end_time.isoformat()]
+
+    return csv_response(['Session ID', 'User ID', 'Domain', 'Score', 'Total Questions', 'Start', 'End'],
+                        generate(), 'results.csv')
+
+SESSION_COLUMNS = (
+    ('session_id', ExamSession.id, 'int64'),
+    ('user_id', ExamSession.user_id, 'int64'),
+    ('exam_id', ExamSession.exam_id, 'int64'),
+    ('domain', ExamSession.domain, 'U20'),
+    ('score', ExamSession.score, 'float64'),
+    ('total_questions', ExamSession.total_questions, 'int32'),
+    ('start_time', ExamSession.start_time, 'datetime64[us]'),
+    ('end_time', ExamSession.end_time, 'datetime64[us]'),
+)
+
+RESPONSE_COLUMNS = (
+    ('session_id', ExamResponse.exam_session_id, 'int64'),
+    ('user_id', ExamSession.user_id, 'int64'),
+    ('exam_id', ExamSession.exam_id, 'int64'),
+    ('domain', ExamSession.domain, 'U20'),
+    ('question_id', ExamResponse.question_id, 'int64'),
+    ('awarded_points', ExamResponse.awarded_points, 'float64'),
+    ('is_correct', ExamResponse.is_correct, 'bool'),
+    ('answered_at', ExamResponse.answered_at, 'datetime64[us]'),
+)
+
+def _typed_value(value, dtype):
+    # Missing ids become -1 and missing numbers 0 so columns keep a fixed dtype; times become NaT
+    if value is None:
+        if dtype.startswith('datetime64'):
+            return None
+        if dtype == 'U20':
+            return ''
+        if dtype == 'bool':
+            return False
+        return -1 if dtype.startswith('int') else 0.0
+    return value
+
+def fetch_columns(query, id_column, columns, batch_size=EXPORT_BATCH_SIZE):
+    """Read `columns` of `query` into preallocated typed NumPy arrays, one batch at a time.
+
+    Rows are bounded by the max id seen at the start so the arrays can be sized up front.
+    """
+    count, max_id = query.with_entities(func.count(id_column), func.max(id_column)).one()
+    arrays = {name: np.empty(count, dtype=dtype) for name, _, dtype in columns}
+    if not count:
+        return arrays
+    rows = (query.with_entities(*[col for _, col, _ in columns])
+            .filter(id_column <= max_id)
+            .order_by(id_column)
+            .yield_per(batch_size))
+    filled = 0
+    batch = []
+
+    def flush():
+        end = filled + len(batch)
+        for index, (name, _, dtype) in enumerate(columns):
+            arrays[name][filled:end] = np.array([_typed_value(row[index], dtype) for row in batch], dtype=dtype)
+        return end
+
+    for row in rows:
+        if filled + len(batch) >= count:
+            break
+        batch.append(row)
+        if len(batch) >= batch_size:
+            filled = flush()
+            batch = []
+    if batch:
+        filled = flush()
+    return {name: array[:filled] for name, array in arrays.items()}
+
+@app.route('/admin/export/columnar')
+@admin_required()
+def export_columnar():
+    """Typed, columnar export of sessions and per-question responses as a NumPy .npz archive.
+
+    Arrays are named sessions__<column> and responses__<column>; load with numpy.load().
+    """
+    filters, error = parse_export_filters(get_admin_scope())
+    if error:
+        flash(error, 'error')
+        return redirect(url_for('admin_results'))
+    sessions = fetch_columns(db.session.query(ExamSession).filter(*filters), ExamSession.id, SESSION_COLUMNS)
+    responses = fetch_columns(db.session.query(ExamResponse)
+                              .join(ExamSession, ExamSession.id == ExamResponse.exam_session_id)
+                              .filter(*filters),
+                              ExamResponse.id, RESPONSE_COLUMNS)
+    arrays = {f'sessions__{name}': array for name, array in sessions.items()}
+    arrays.update({f'responses__{name}': array for name, array in responses.items()})
+    output = tempfile.TemporaryFile()
+    np.savez_compressed(output, **arrays)
+    output.seek(0)
+    return send_file(output, mimetype='application/octet-stream', as_attachment=True, download_name='results.npz')
+
+IMPORT_BATCH_SIZE = 1000
+IMPORT_ERROR_LIMIT = 200
+
+class ImportReport:
+    def __init__(self):
+        self.inserted = 0
+        self.error_count = 0
+        self.errors = []  # (line number, message), first IMPORT_ERROR_LIMIT only
+        self.stopped_at = None  # (line number, message) if the file became unreadable partway
+
+    def add_error(self, line_number, message):
+        self.error_count += 1
+        if len(self.errors) < IMPORT_ERROR_LIMIT:
+            self.errors.append((line_number, message))
+
+def import_questions(text_stream, fmt, allowed_domains, batch_size=IMPORT_BATCH_SIZE):
+    """Stream questions from a CSV/JSONL text stream into the bank.
+
+    Valid rows are bulk-inserted and committed every `batch_size` rows, so a bad row only
+    costs its own line and memory stays flat however large the file. If the file stops being
+    readable partway (bad encoding, broken CSV quoting), the rows before that point are kept
+    and the report's `stopped_at` says where reading stopped, so the rest can be imported on
+    its own. Raises question_io.QuestionFormatError if the file can't be read at all.
+    """
+    report = ImportReport()
+    batch = []
+
+    def flush():
+        db.session.execute(Question.__table__.insert(), batch)
+        db.session.commit()
+        report.inserted += len(batch)
+        batch.clear()
+
+    now = datetime.utcnow()
+    last_line = 0
+    try:
+        for line_number, row, error in question_io.iter_validated(text_stream, fmt, allowed_domains):
+            last_line = line_number
+            if error:
+                report.add_error(line_number, error)
+                continue
+            row['created_at'] = now
+            batch.append(row)
+            if len(batch) >= batch_size:
+                flush()
+    except (UnicodeDecodeError, csv.Error) as e:
+        report.stopped_at = (last_line + 1, str(e))
+    if batch:
+        flush()
+    # Imported rows go in through executemany, so sign them afterwards; a large file's backlog
+    # is left to the duplicate checks and `flask update-similarity-index` instead of this request
+    update_similarity_index(max_questions=SIMILARITY_BATCH_QUESTIONS)
+    return report
+
+def question_export_records(domains):
+    rows = (db.session.query(*(getattr(Question, field) for field in question_io.QUESTION_FIELDS))
+            .filter(Question.domain.in_(domains))
+            .order_by(Question.id)
+            .yield_per(EXPORT_BATCH_SIZE))
+    return (question_io.export_record(row) for row in rows)
+
+@app.route('/admin/questions/import', methods=['GET', 'POST'])
+@admin_required()
+def import_questions_view():
+    scope = get_admin_scope()
+    report = None
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash('Choose a CSV or JSONL file to import.', 'error')
+            return redirect(url_for('import_questions_view'))
+        fmt = request.form.get('format') or question_io.guess_format(upload.filename)
+        try:
+            report = import_questions(TextIOWrapper(upload.stream, encoding='utf-8-sig', newline=''), fmt, scope.domains)
+        except (question_io.QuestionFormatError, UnicodeDecodeError, csv.Error) as e:
+            db.session.rollback()
+            flash(f'Could not read the file: {e}', 'error')
+            return redirect(url_for('import_questions_view'))
+        if report.stopped_at:
+            flash(f'Stopped reading the file at line {report.stopped_at[0]}: {report.stopped_at[1]}. '
+                  f'The {report.inserted} question(s) before it were imported; re-import only the rest of the file.',
+                  'warning')
+        else:
+            flash(f'Imported {report.inserted} question(s); {report.error_count} row(s) rejected.',
+                  'success' if not report.error_count else 'warning')
+    return render_template('import_questions.html', domains=scope.domains, report=report,
+                           fields=question_io.QUESTION_FIELDS, error_limit=IMPORT_ERROR_LIMIT)
+
+@app.route('/admin/questions/export')
+@admin_required()
+def export_questions():
+    scope = get_admin_scope()
+    domain = request.args.get('domain')
+    if domain and not scope.allows(domain):
+        flash('You are not allowed to export questions for this domain.', 'error')
+        return redirect(url_for('admin_dashboard_json'))
+    fmt = request.args.get('format', 'csv')
+    if fmt not in question_io.FORMATS:
+        flash('Unknown export format.', 'error')
+        return redirect(url_for('import_questions_view'))
+    chunks = question_io.iter_export(question_export_records([domain] if domain else scope.domains), fmt,
+                                     flush_every=EXPORT_BATCH_SIZE)
+    filename = f"questions_{domain or 'all'}.{fmt}"
+    return app.response_class(stream_with_context(chunk.encode('utf-8') for chunk in chunks),
+                              mimetype='text/csv' if fmt == 'csv' else 'application/x-ndjson',
+                              headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+@app.cli.command('import-questions')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(question_io.FORMATS), default=None,
+              help='File format (default: from the file extension).')
+@click.option('--batch-size', default=IMPORT_BATCH_SIZE, show_default=True, help='Rows per insert transaction.')
+def import_questions_command(path, fmt, batch_size):
+    """Bulk-import questions from a CSV or JSON Lines file."""
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        report = import_questions(f, fmt or question_io.guess_format(path), ALL_DOMAINS, batch_size=batch_size)
+    update_similarity_index()
+    for line_number, message in report.errors:
+        print(f"  line {line_number}: {message}")
+    if report.error_count > len(report.errors):
+        print(f"  ... and {report.error_count - len(report.errors)} more")
+    if report.stopped_at:
+        print(f"  stopped at line {report.stopped_at[0]}: {report.stopped_at[1]}; the rest of the file was not imported")
+    print(f"✓ Imported {report.inserted} question(s), {report.error_count} row(s) rejected")
+
+@app.cli.command('export-questions')
+@click.argument('path', type=click.Path(dir_okay=False, writable=True))
+@click.option('--domain', type=click.Choice(ALL_DOMAINS), default=None, help='Only this domain (default: all).')
+@click.option('--format', 'fmt', type=click.Choice(question_io.FORMATS), default=None,
+              help='File format (default: from the file extension).')
+def export_questions_command(path, domain, fmt):
+    """Write the question bank to a CSV or JSON Lines file."""
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        for chunk in question_io.iter_export(question_export_records([domain] if domain else ALL_DOMAINS),
+                                             fmt or question_io.guess_format(path), flush_every=EXPORT_BATCH_SIZE):
+            f.write(chunk)
+    print(f"✓ Questions written to {path}")
 
 if __name__ == '__main__':
     app.run(debug=True)
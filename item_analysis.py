@@ -0,0 +1,100 @@
+"""
+Item analysis for exam questions: difficulty (p-value), discrimination, option choice
+frequencies and time-to-answer.
+
+Everything is kept as additive sums per question, so results can be folded in batch by
+batch as sessions complete instead of rescanning every response. The functions here are
+pure NumPy; app.py loads the response arrays and stores the sums in the question_stat table.
+"""
+
+import numpy as np
+
+OPTION_LETTERS = ('A', 'B', 'C', 'D')
+
+# Additive per-question sums. x is the item score as a fraction of the question's points,
+# y is the rest-of-exam score (session total minus this item), used for discrimination.
+SUM_FIELDS = (
+    'responses', 'sum_x', 'sum_x2', 'sum_y', 'sum_y2', 'sum_xy', 'correct_count',
+    'option_a_count', 'option_b_count', 'option_c_count', 'option_d_count',
+    'timed_count', 'sum_seconds',
+)
+
+
+def response_sums(session_ids, question_ids, awarded, points, is_correct, selected, seconds):
+    """Aggregate one batch of responses into per-question sums.
+
+    All arguments are 1-D arrays with one entry per response, except `selected`, which is
+    an (n, 4) boolean matrix of the MCQ options chosen (all False for text questions).
+    `seconds` is the time from session start to the answer, NaN where unknown.
+    The batch must contain every response of each session it includes, since session
+    totals are computed from it. Returns (unique question ids, {field: array}).
+    """
+    session_ids = np.asarray(session_ids)
+    question_ids = np.asarray(question_ids)
+    awarded = np.asarray(awarded, dtype=np.float64)
+    points = np.asarray(points, dtype=np.float64)
+    if len(question_ids) == 0:
+        return question_ids, {field: np.zeros(0) for field in SUM_FIELDS}
+
+    x = np.clip(np.divide(awarded, points, out=np.zeros_like(awarded), where=points > 0), 0.0, 1.0)
+    _, session_index = np.unique(session_ids, return_inverse=True)
+    session_totals = np.bincount(session_index, weights=awarded)
+    y = session_totals[session_index] - awarded
+
+    unique_qids, q_index = np.unique(question_ids, return_inverse=True)
+    size = len(unique_qids)
+
+    def total(weights=None):
+        return np.bincount(q_index, weights=weights, minlength=size).astype(np.float64)
+
+    seconds = np.asarray(seconds, dtype=np.float64)
+    timed = ~np.isnan(seconds)
+    selected = np.asarray(selected, dtype=bool).reshape(len(question_ids), len(OPTION_LETTERS))
+    sums = {
+        'responses': total(),
+        'sum_x': total(x),
+        'sum_x2': total(x * x),
+        'sum_y': total(y),
+        'sum_y2': total(y * y),
+        'sum_xy': total(x * y),
+        'correct_count': total(np.asarray(is_correct, dtype=np.float64)),
+        'timed_count': total(timed.astype(np.float64)),
+        'sum_seconds': total(np.where(timed, seconds, 0.0)),
+    }
+    for column, letter in enumerate(OPTION_LETTERS):
+        sums[f'option_{letter.lower()}_count'] = total(selected[:, column].astype(np.float64))
+    return unique_qids, sums
+
+
+def selected_options(answers, is_mcq):
+    """(n, 4) boolean matrix of which of A-D appear in each stored MCQ answer ('A' or 'A,C')."""
+    answers = np.asarray(answers, dtype=str)
+    is_mcq = np.asarray(is_mcq, dtype=bool)
+    if answers.size == 0:
+        return np.zeros((0, len(OPTION_LETTERS)), dtype=bool)
+    letters = np.char.split(np.char.upper(answers), ',')
+    matrix = np.zeros((len(answers), len(OPTION_LETTERS)), dtype=bool)
+    for column, letter in enumerate(OPTION_LETTERS):
+        matrix[:, column] = [letter in parts for parts in letters]
+    return matrix & is_mcq[:, None]
+
+
+def p_value(responses, sum_x):
+    """Difficulty: mean item score as a fraction of the points (1.0 = everyone got it)."""
+    responses = np.asarray(responses, dtype=np.float64)
+    return np.divide(sum_x, responses, out=np.zeros_like(responses), where=responses > 0)
+
+
+def discrimination(responses, sum_x, sum_x2, sum_y, sum_y2, sum_xy):
+    """Item-rest correlation (point-biserial for right/wrong items), 0 where undefined."""
+    n = np.asarray(responses, dtype=np.float64)
+    cov = n * np.asarray(sum_xy) - np.asarray(sum_x) * np.asarray(sum_y)
+    var_x = n * np.asarray(sum_x2) - np.square(sum_x)
+    var_y = n * np.asarray(sum_y2) - np.square(sum_y)
+    denom = np.sqrt(np.clip(var_x, 0.0, None) * np.clip(var_y, 0.0, None))
+    return np.divide(cov, denom, out=np.zeros_like(n), where=denom > 1e-12)
+
+
+def mean_seconds(timed_count, sum_seconds):
+    timed_count = np.asarray(timed_count, dtype=np.float64)
+    return np.divide(sum_seconds, timed_count, out=np.zeros_like(timed_count), where=timed_count > 0)
@@ -0,0 +1,173 @@
+"""
+Reading, validating and writing question banks as CSV or JSON Lines.
+
+One record per question with the columns in QUESTION_FIELDS, for all three question
+types. Everything here works on plain dicts and iterators so files of any size can be
+streamed; app.py does the batched inserts and the HTTP/CLI plumbing.
+"""
+
+import csv
+import io
+import json
+
+import answer_matching
+
+QUESTION_FIELDS = (
+    'domain', 'question_type', 'question_text', 'option_a', 'option_b', 'option_c', 'option_d',
+    'correct_answer', 'correct_answer_text', 'points', 'partial_credit',
+)
+QUESTION_TYPES = ('mcq_single', 'mcq_multi', 'short_text')
+FORMATS = ('csv', 'jsonl')
+OPTION_LETTERS = ('A', 'B', 'C', 'D')
+MAX_OPTION_LENGTH = 200  # Question.option_* is String(200)
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 't'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', 'f'}
+
+
+class QuestionFormatError(ValueError):
+    """The file as a whole can't be read (bad format, missing header columns...)."""
+
+
+def guess_format(filename, default='csv'):
+    name = (filename or '').lower()
+    if name.endswith('.jsonl') or name.endswith('.ndjson'):
+        return 'jsonl'
+    if name.endswith('.csv'):
+        return 'csv'
+    return default
+
+
+def iter_records(text_stream, fmt):
+    """Yield (line_number, record_or_None, parse_error_or_None) from an open text stream."""
+    if fmt == 'csv':
+        reader = csv.DictReader(text_stream)
+        missing = {'domain', 'question_text'} - set(reader.fieldnames or ())
+        if missing:
+            raise QuestionFormatError(f"CSV header is missing column(s): {', '.join(sorted(missing))}")
+        for record in reader:
+            yield reader.line_num, record, None
+    elif fmt == 'jsonl':
+        for line_number, line in enumerate(text_stream, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_number, None, f'invalid JSON: {e}'
+                continue
+            if not isinstance(record, dict):
+                yield line_number, None, 'expected a JSON object'
+                continue
+            yield line_number, record, None
+    else:
+        raise QuestionFormatError(f'Unsupported format {fmt!r}; use one of {", ".join(FORMATS)}')
+
+
+def _text(record, field):
+    value = record.get(field)
+    return '' if value is None else str(value).strip()
+
+
+def _bool(value, default):
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return default
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise ValueError(f'partial_credit must be true/false, got {value!r}')
+
+
+def validate_record(record, allowed_domains):
+    """Normalize one record into Question column values. Returns (row, None) or (None, error)."""
+    domain = _text(record, 'domain')
+    if domain not in allowed_domains:
+        return None, f'domain {domain!r} is not one you can import into'
+    question_type = _text(record, 'question_type') or 'mcq_single'
+    if question_type not in QUESTION_TYPES:
+        return None, f'unknown question_type {question_type!r}'
+    question_text = _text(record, 'question_text')
+    if not question_text:
+        return None, 'question_text is empty'
+    try:
+        points = float(_text(record, 'points') or 1)
+    except ValueError:
+        return None, f"points must be a number, got {record.get('points')!r}"
+    try:
+        partial_credit = _bool(record.get('partial_credit'), True)
+    except ValueError as e:
+        return None, str(e)
+    if points <= 0:
+        return None, 'points must be positive'
+    row = {
+        'domain': domain, 'question_type': question_type, 'question_text': question_text,
+        'points': points, 'partial_credit': partial_credit,
+    }
+    if question_type == 'short_text':
+        correct_text = _text(record, 'correct_answer_text')
+        if not correct_text:
+            return None, 'short_text questions need correct_answer_text'
+        error = answer_matching.validate(correct_text)
+        if error:
+            return None, f'correct_answer_text: {error}'
+        row.update(option_a='', option_b='', option_c='', option_d='', correct_answer='', correct_answer_text=correct_text)
+        return row, None
+    options = {f'option_{letter.lower()}': _text(record, f'option_{letter.lower()}') for letter in OPTION_LETTERS}
+    empty = [name for name, value in options.items() if not value]
+    if empty:
+        return None, f"MCQ questions need all four options (empty: {', '.join(empty)})"
+    too_long = [name for name, value in options.items() if len(value) > MAX_OPTION_LENGTH]
+    if too_long:
+        return None, f"options longer than {MAX_OPTION_LENGTH} characters: {', '.join(too_long)}"
+    letters = {part.strip().upper() for part in _text(record, 'correct_answer').split(',') if part.strip()}
+    if not letters or not letters <= set(OPTION_LETTERS):
+        return None, f"correct_answer must be letters A-D, got {record.get('correct_answer')!r}"
+    if question_type == 'mcq_single' and len(letters) != 1:
+        return None, 'mcq_single questions take exactly one correct letter'
+    row.update(options, correct_answer=','.join(sorted(letters)), correct_answer_text=None)
+    return row, None
+
+
+def iter_validated(text_stream, fmt, allowed_domains):
+    """Yield (line_number, row, error) for every record; exactly one of row/error is set."""
+    for line_number, record, error in iter_records(text_stream, fmt):
+        if error is None:
+            row, error = validate_record(record, allowed_domains)
+        else:
+            row = None
+        yield line_number, row, error
+
+
+def export_record(question):
+    """Record for a Question (or row with the same attributes), the inverse of validate_record."""
+    record = {field: getattr(question, field) for field in QUESTION_FIELDS}
+    record['partial_credit'] = bool(record['partial_credit']) if record['partial_credit'] is not None else True
+    return record
+
+
+def iter_export(records, fmt, flush_every=1000):
+    """Yield text chunks of CSV or JSON Lines for an iterable of export records."""
+    if fmt == 'jsonl':
+        lines = []
+        for record in records:
+            lines.append(json.dumps(record, ensure_ascii=False))
+            if len(lines) >= flush_every:
+                yield '\n'.join(lines) + '\n'
+                lines = []
+        if lines:
+            yield '\n'.join(lines) + '\n'
+        return
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=QUESTION_FIELDS)
+    writer.writeheader()
+    for i, record in enumerate(records, 1):
+        writer.writerow({k: ('' if v is None else v) for k, v in record.items()})
+        if i % flush_every == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+    yield buffer.getvalue()
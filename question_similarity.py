@@ -0,0 +1,81 @@
+"""
+Near-duplicate detection for questions with MinHash signatures and LSH banding.
+
+A question's text and (sorted) options are normalized and cut into 5-byte shingles.
+MinHash turns the shingle set into a fixed-size signature, where the share of equal
+positions estimates the Jaccard similarity of two questions. Splitting the signature into
+bands gives bucket keys: questions sharing any bucket are candidates, so finding matches
+is a few indexed lookups instead of a scan of the bank. app.py stores the signatures and
+band buckets; everything here is pure NumPy.
+"""
+
+import re
+import zlib
+
+import numpy as np
+
+NUM_PERMUTATIONS = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERMUTATIONS // BANDS
+SHINGLE_SIZE = 5
+# Estimated Jaccard similarity from which two questions are reported as near-duplicates.
+# With 16 bands of 4 rows, pairs at this similarity share a bucket ~90% of the time.
+DUPLICATE_THRESHOLD = 0.6
+
+# Multiply-shift hashing: permutation i maps a shingle x to the high 32 bits of A[i] * x + B[i]
+# (mod 2**64). The constants are fixed so stored signatures stay comparable across processes.
+_rng = np.random.default_rng(20240611)
+_A = _rng.integers(0, 1 << 63, size=NUM_PERMUTATIONS, dtype=np.uint64) | np.uint64(1)
+_B = _rng.integers(0, 1 << 63, size=NUM_PERMUTATIONS, dtype=np.uint64)
+_SHIFT = np.uint64(32)
+_EMPTY = np.full(NUM_PERMUTATIONS, np.iinfo(np.uint32).max, dtype=np.uint32)
+
+_NON_WORD = re.compile(r'[^0-9a-z]+')
+
+
+def normalize(text):
+    return _NON_WORD.sub(' ', (text or '').lower()).strip()
+
+
+def fingerprint_text(question_text, options=()):
+    """The text a question is compared on: its wording plus its options, order-independent."""
+    parts = [normalize(question_text)]
+    parts.extend(sorted(normalize(option) for option in options if option and normalize(option)))
+    return ' | '.join(parts)
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """Every `size`-byte window of the UTF-8 text (the whole text if shorter), packed into a uint64."""
+    data = np.frombuffer(text.encode('utf-8'), dtype=np.uint8).astype(np.uint64)
+    if data.size == 0:
+        return np.zeros(0, dtype=np.uint64)
+    width = min(size, data.size)
+    return np.lib.stride_tricks.sliding_window_view(data, width) @ (np.uint64(256) ** np.arange(width, dtype=np.uint64))
+
+
+def signature(text):
+    """MinHash signature (uint32[NUM_PERMUTATIONS]) of a fingerprint text."""
+    values = shingles(text)
+    if values.size == 0:
+        return _EMPTY.copy()
+    return ((np.outer(values, _A) + _B) >> _SHIFT).min(axis=0).astype(np.uint32)
+
+
+def band_keys(sig):
+    """One bucket key per band, the band number in the high bits so keys never collide across bands."""
+    rows = np.asarray(sig, dtype=np.uint32).reshape(BANDS, ROWS_PER_BAND)
+    return [(band << 32) | zlib.crc32(row.tobytes()) for band, row in enumerate(rows)]
+
+
+def to_bytes(sig):
+    return np.asarray(sig, dtype=np.uint32).tobytes()
+
+
+def from_bytes(data):
+    return np.frombuffer(data, dtype=np.uint32)
+
+
+def similarity(sig, others):
+    """Estimated Jaccard similarity of `sig` to each row of `others` (shape (n, NUM_PERMUTATIONS))."""
+    others = np.asarray(others, dtype=np.uint32).reshape(-1, NUM_PERMUTATIONS)
+    return (others == np.asarray(sig, dtype=np.uint32)).mean(axis=1)
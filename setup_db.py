@@ -167,17 +167,8 @@ def create_sample_data():
         for domain, questions in domains_questions:
             existing_count = Question.query.filter_by(domain=domain).count()
             if existing_count == 0:
-                for q_data in questions:
-                    question = Question(
-                        domain=domain,
-                        question_text=q_data['question_text'],
-                        option_a=q_data['option_a'],
-                        option_b=q_data['option_b'],
-                        option_c=q_data['option_c'],
-                        option_d=q_data['option_d'],
-                        correct_answer=q_data['correct_answer']
-                    )
-                    db.session.add(question)
+                # One executemany instead of a flush per question
+                db.session.execute(Question.__table__.insert(), [dict(q_data, domain=domain) for q_data in questions])
                 print(f"✓ Added {len(questions)} questions for {domain.replace('_', ' ').title()}")
             else:
                 print(f"✓ {domain.replace('_', ' ').title()} questions already exist ({existing_count} questions)")